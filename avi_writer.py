@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Запись готовых JPEG кадров в MJPEG AVI без перекодирования.
+Рядом пишется <файл>.ts.csv с временем захвата (часы робота) и приёма.
+Запись идёт в фоновом потоке крупными буферизованными блоками;
+если диск не успевает, кадры отбрасываются, а не тормозят вызывающего.
+Длинная запись режется на файлы до 1 ГБ (предел AVI 1.0 для совместимых
+плееров): <файл>.avi, <файл>_001.avi, ...
+"""
+
+import os
+import queue
+import struct
+import threading
+import time
+
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+# Файл вместе с индексом idx1 должен уложиться в 1 ГБ
+MAX_FILE_BYTES = 1024 ** 3
+
+
+def jpeg_size(data):
+    """Ширина и высота из маркера SOF без декодирования"""
+    i = 2
+    n = len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        length = (data[i + 2] << 8) | data[i + 3]
+        # SOF0..SOF15, кроме DHT (C4), JPG (C8) и DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        i += 2 + length
+    return 0, 0
+
+
+class MjpegAviWriter:
+    def __init__(self, path, max_queue=120, buffer_size=4 * 1024 * 1024,
+                 max_file_bytes=MAX_FILE_BYTES):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.max_file_bytes = max_file_bytes
+        self._queue = queue.Queue(maxsize=max_queue)
+
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.paths = []  # Все записанные файлы по порядку
+
+        self._reset_file()
+
+        self._thread = threading.Thread(target=self._writer, name="avi_writer", daemon=True)
+        self._thread.start()
+
+    def write(self, jpeg, t_capture_ns=None, t_recv_ns=None, frame_id=None):
+        """Ставит кадр в очередь записи, никогда не блокирует"""
+        if t_recv_ns is None:
+            t_recv_ns = time.monotonic_ns()
+        try:
+            self._queue.put_nowait((jpeg, frame_id, t_capture_ns, t_recv_ns))
+            return True
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _reset_file(self):
+        """Состояние текущего файла: индекс, счётчик кадров, время"""
+        self._index = bytearray()
+        self._max_chunk = 0
+        self._file_frames = 0
+        self._first_t_ns = None
+        self._last_t_ns = None
+
+    def _next_path(self):
+        if not self.paths:
+            return self.path
+        base, ext = os.path.splitext(self.path)
+        return f"{base}_{len(self.paths):03d}{ext}"
+
+    def _open_file(self, jpeg):
+        path = self._next_path()
+        self.paths.append(path)
+        width, height = jpeg_size(jpeg)
+        f = open(path, "wb", buffering=self.buffer_size)
+        ts = open(path + ".ts.csv", "w", buffering=256 * 1024)
+        ts.write("frame,robot_frame_id,t_capture_ns,t_recv_ns\n")
+        self._write_headers(f, width, height)
+        return f, ts
+
+    def _close_file(self, f, ts):
+        try:
+            self._finish(f)
+        finally:
+            f.close()
+            ts.close()
+            self._reset_file()
+
+    def _write_headers(self, f, width, height):
+        f.write(b"RIFF" + struct.pack("<I", 0) + b"AVI ")
+        f.write(b"LIST" + struct.pack("<I", 4 + 8 + 56 + 8 + 4 + 8 + 56 + 8 + 40) + b"hdrl")
+
+        # avih: поля с длительностью и числом кадров дописываются в конце
+        self._avih_pos = f.tell() + 8
+        f.write(b"avih" + struct.pack("<I", 56))
+        f.write(struct.pack(
+            "<10I4I",
+            0, 0, 0, AVIF_HASINDEX, 0, 0, 1, 0, width, height, 0, 0, 0, 0
+        ))
+
+        f.write(b"LIST" + struct.pack("<I", 4 + 8 + 56 + 8 + 40) + b"strl")
+        self._strh_pos = f.tell() + 8
+        f.write(b"strh" + struct.pack("<I", 56))
+        f.write(b"vids" + b"MJPG" + struct.pack(
+            "<IHHIIIIIIiI4H",
+            0, 0, 0, 0, 1, 15, 0, 0, 0, -1, 0, 0, 0, width, height
+        ))
+        f.write(b"strf" + struct.pack("<I", 40))
+        f.write(struct.pack(
+            "<IiiHH4sIiiII",
+            40, width, height, 1, 24, b"MJPG", width * height * 3, 0, 0, 0, 0
+        ))
+
+        self._movi_pos = f.tell()
+        f.write(b"LIST" + struct.pack("<I", 0) + b"movi")
+
+    def _finish(self, f):
+        movi_end = f.tell()
+        f.write(b"idx1" + struct.pack("<I", len(self._index)))
+        f.write(self._index)
+        file_end = f.tell()
+
+        # Средняя частота по времени захвата (или приёма)
+        frames = self._file_frames
+        if frames > 1 and self._last_t_ns > self._first_t_ns:
+            us_per_frame = (self._last_t_ns - self._first_t_ns) // 1000 // (frames - 1)
+        else:
+            us_per_frame = 66666
+        us_per_frame = max(1, us_per_frame)
+
+        f.seek(4)
+        f.write(struct.pack("<I", file_end - 8))
+        f.seek(self._movi_pos + 4)
+        f.write(struct.pack("<I", movi_end - self._movi_pos - 8))
+        f.seek(self._avih_pos)
+        f.write(struct.pack("<I", us_per_frame))
+        f.seek(self._avih_pos + 16)
+        f.write(struct.pack("<I", frames))
+        f.seek(self._avih_pos + 28)
+        f.write(struct.pack("<I", self._max_chunk))
+        # strh: dwScale/dwRate = us_per_frame/1e6, dwLength = frames
+        f.seek(self._strh_pos + 20)
+        f.write(struct.pack("<II", us_per_frame, 1000000))
+        f.seek(self._strh_pos + 32)
+        f.write(struct.pack("<II", frames, self._max_chunk))
+
+    def _writer(self):
+        f = None
+        ts = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                jpeg, frame_id, t_capture_ns, t_recv_ns = item
+
+                size = len(jpeg)
+                # Кадр + его запись в индексе + idx1 должны поместиться в файл
+                needed = 8 + size + 1 + len(self._index) + 16 + 8
+                if f is not None and self._file_frames and f.tell() + needed > self.max_file_bytes:
+                    full, f = f, None
+                    self._close_file(full, ts)
+                if f is None:
+                    f, ts = self._open_file(jpeg)
+
+                offset = f.tell() - self._movi_pos - 8
+                f.write(b"00dc" + struct.pack("<I", size))
+                f.write(jpeg)
+                if size & 1:
+                    f.write(b"\x00")
+                self._index += b"00dc" + struct.pack("<III", AVIIF_KEYFRAME, offset, size)
+                self._max_chunk = max(self._max_chunk, size)
+
+                t_ns = t_capture_ns if t_capture_ns is not None else t_recv_ns
+                if self._first_t_ns is None:
+                    self._first_t_ns = t_ns
+                self._last_t_ns = t_ns
+
+                ts.write(f"{self._file_frames},{'' if frame_id is None else frame_id},"
+                         f"{'' if t_capture_ns is None else t_capture_ns},{t_recv_ns}\n")
+                self._file_frames += 1
+                self.frames_written += 1
+        except OSError as e:
+            print(f"❌ Ошибка записи видео: {e}")
+        finally:
+            if f is not None:
+                self._close_file(f, ts)
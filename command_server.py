@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+REP-сервер команд движения поверх любого контроллера моторов
+(RobotController, GPIODRobotController, SysfsRobotController)
+"""
+
+import zmq
+import json
+import threading
+import time
+
+
+class CommandServer:
+    def __init__(self, controller, port=5556, context=None, on_command=None,
+                 config_handler=None, limits=None, lock=None):
+        # None - моторы недоступны (например, не удалось пересоздать контроллер):
+        # команды движения получают ошибку, config продолжает работать
+        self.controller = controller
+        self.port = port
+        # Вызывается как on_command(message, t_recv_ns, t_done_ns) после каждой команды
+        self.on_command = on_command
+        # Команды "config" / "config:{...}": config_handler(updates или None) -> dict
+        self.config_handler = config_handler
+        # Пределы скорости {"min_speed", "max_speed"}; применяются на следующей команде
+        self.limits = limits
+        # Общий замок всех вызовов контроллера (команды, аварийный стоп, замена):
+        # пины пишутся по одному, и чередование записей оставило бы колесо включённым
+        self.lock = lock if lock is not None else threading.Lock()
+        self._own_context = context is None
+        self.context = context if context is not None else zmq.Context()
+        self.socket = self.context.socket(zmq.REP)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(f"tcp://*:{self.port}")
+        self.command_count = 0
+
+    def set_limits(self, limits):
+        """Потокобезопасно: словарь заменяется целиком"""
+        self.limits = dict(limits)
+
+    def _apply_limits(self, message):
+        """Ограничивает скорость текущими пределами; возвращает команду"""
+        limits = self.limits
+        if not limits:
+            return message
+        low, high = limits["min_speed"], limits["max_speed"]
+        if not low <= self.controller.current_speed <= high:
+            self.controller.current_speed = min(max(self.controller.current_speed, low), high)
+        if message.startswith("speed:"):
+            try:
+                speed = float(message.split(":")[1])
+            except ValueError:
+                return message  # Ошибку покажет контроллер
+            return f"speed:{min(max(speed, low), high):.2f}"
+        return message
+
+    def _handle_config(self, message):
+        if self.config_handler is None:
+            return {"status": "error", "command": "config", "error": "конфиг недоступен"}
+        updates = None
+        if message.startswith("config:"):
+            try:
+                updates = json.loads(message[len("config:"):])
+            except ValueError as e:
+                return {"status": "error", "command": "config", "error": f"JSON: {e}"}
+        return self.config_handler(updates)
+
+    def handle(self, message):
+        """Выполняет одну команду и формирует ответ"""
+        if message == "config" or message.startswith("config:"):
+            return self._handle_config(message)
+
+        t_recv_ns = time.monotonic_ns()
+        with self.lock:
+            # Контроллер могли заменить, пока ждали замок
+            controller = self.controller
+            if controller is None:
+                return {"status": "error", "command": message, "error": "моторы недоступны"}
+            message = self._apply_limits(message)
+            controller.execute_command(message)
+            t_done_ns = time.monotonic_ns()
+            # Под замком: аварийный стоп не может вклиниться между записью
+            # пинов и учётом последней команды
+            if self.on_command:
+                self.on_command(message, t_recv_ns, t_done_ns)
+        self.command_count += 1
+
+        return {
+            "status": "success",
+            "command": message,
+            "speed": controller.current_speed,
+            "t_recv_ns": t_recv_ns,
+            "t_done_ns": t_done_ns
+        }
+
+    def serve(self, stop_event=None, poll_ms=100):
+        """Обрабатывает команды до stop_event (или бесконечно)"""
+        print(f"📝 Ожидание команд на порту {self.port}...")
+
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+
+        try:
+            while stop_event is None or not stop_event.is_set():
+                # Короткий poll, чтобы вовремя заметить stop_event
+                if not poller.poll(poll_ms):
+                    continue
+
+                message = self.socket.recv_string()
+                response = self.handle(message)
+                self.socket.send_string(json.dumps(response))
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        # Моторы останавливаем, но контроллер не закрываем:
+        # им владеет тот, кто его создал
+        with self.lock:
+            if self.controller is not None:
+                self.controller.stop()
+        self.socket.close()
+        if self._own_context:
+            self.context.term()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Единый конфиг робота (JSON) и его проверка.
+
+Изменения применяются на лету командой по каналу управления:
+    config                      - вернуть действующий конфиг
+    config:{"motors": {"max_speed": 0.8}}  - частичное обновление
+Обновление сливается с текущим конфигом, проверяется целиком и
+применяется только если ошибок нет.
+"""
+
+import copy
+import json
+import os
+
+from motors import BACKENDS as MOTOR_BACKENDS, MOCK_BACKEND
+from robot import DEFAULT_RENDITIONS, ROI_TOPIC
+
+DEFAULT_PINS = {
+    'left_forward': 12,
+    'left_backward': 13,
+    'right_forward': 19,
+    'right_backward': 18
+}
+
+DEFAULT_CONFIG = {
+    "ports": {"video": 5555, "commands": 5556, "telemetry": 5557, "video_control": 5558},
+    "camera": {"index": 0, "width": 640, "height": 480, "fps": 15, "fourcc": None},
+    "renditions": DEFAULT_RENDITIONS,
+    "motors": {
+        "backend": "auto",
+        "pins": DEFAULT_PINS,
+        "speed": 0.7,
+        "min_speed": 0.1,
+        "max_speed": 1.0
+    }
+}
+
+BACKENDS = ("auto",) + MOTOR_BACKENDS + (MOCK_BACKEND,)
+RENDITION_KEYS = {"topic", "width", "height", "quality", "fps"}
+
+
+def merge(base, updates):
+    """Глубокое слияние словарей; списки и значения заменяются целиком"""
+    result = copy.deepcopy(base)
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = merge(result[key], value)
+        else:
+            result[key] = copy.deepcopy(value)
+    return result
+
+
+def _check_number(errors, name, value, low, high, integer=False):
+    kind = int if integer else (int, float)
+    if isinstance(value, bool) or not isinstance(value, kind):
+        errors.append(f"{name}: ожидается {'целое' if integer else 'число'}, получено {value!r}")
+    elif not low <= value <= high:
+        errors.append(f"{name}: {value} вне диапазона [{low}, {high}]")
+
+
+def validate(config):
+    """Проверяет конфиг целиком; ValueError со списком всех ошибок"""
+    errors = []
+
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        errors.append(f"неизвестные разделы: {sorted(unknown)}")
+    for section, default in DEFAULT_CONFIG.items():
+        if not isinstance(config.get(section), type(default)):
+            errors.append(f"{section}: ожидается {type(default).__name__}")
+    if errors:
+        raise ValueError("; ".join(errors))
+
+    ports = config["ports"]
+    if set(ports) != set(DEFAULT_CONFIG["ports"]):
+        errors.append(f"ports: нужны ключи {sorted(DEFAULT_CONFIG['ports'])}")
+    for name, port in ports.items():
+        _check_number(errors, f"ports.{name}", port, 1024, 65535, integer=True)
+    if len(set(ports.values())) != len(ports):
+        errors.append("ports: порты должны различаться")
+
+    camera = config["camera"]
+    if set(camera) != set(DEFAULT_CONFIG["camera"]):
+        errors.append(f"camera: нужны ключи {sorted(DEFAULT_CONFIG['camera'])}")
+    _check_number(errors, "camera.index", camera.get("index"), 0, 63, integer=True)
+    _check_number(errors, "camera.width", camera.get("width"), 16, 4096, integer=True)
+    _check_number(errors, "camera.height", camera.get("height"), 16, 4096, integer=True)
+    _check_number(errors, "camera.fps", camera.get("fps"), 1, 120)
+    fourcc = camera.get("fourcc")
+    if fourcc is not None and not (isinstance(fourcc, str) and len(fourcc) == 4):
+        errors.append(f"camera.fourcc: ожидается 4 символа, получено {fourcc!r}")
+
+    renditions = config["renditions"]
+    if not isinstance(renditions, list) or not renditions:
+        errors.append("renditions: нужен хотя бы один вариант потока")
+        renditions = []
+    topics = set()
+    for i, r in enumerate(renditions):
+        name = f"renditions[{i}]"
+        if not isinstance(r, dict):
+            errors.append(f"{name}: ожидается объект")
+            continue
+        if set(r) != RENDITION_KEYS:
+            errors.append(f"{name}: нужны ключи {sorted(RENDITION_KEYS)}")
+        topic = r.get("topic")
+        if not isinstance(topic, str) or not topic or " " in topic:
+            errors.append(f"{name}.topic: непустая строка без пробелов")
+        elif topic == ROI_TOPIC:
+            # Топик области интереса: кадры попали бы в окно ROI приёмника
+            errors.append(f"{name}.topic: '{ROI_TOPIC}' зарезервирован")
+        elif topic in topics:
+            errors.append(f"{name}.topic: повтор '{topic}'")
+        topics.add(topic)
+        _check_number(errors, f"{name}.width", r.get("width"), 16, 4096, integer=True)
+        _check_number(errors, f"{name}.height", r.get("height"), 16, 4096, integer=True)
+        _check_number(errors, f"{name}.quality", r.get("quality"), 1, 100, integer=True)
+        _check_number(errors, f"{name}.fps", r.get("fps"), 0.1, 120)
+
+    motors = config["motors"]
+    if motors["backend"] not in BACKENDS:
+        errors.append(f"motors.backend: одно из {BACKENDS}")
+    pins = motors["pins"] if isinstance(motors["pins"], dict) else {}
+    if set(pins) != set(DEFAULT_PINS):
+        errors.append(f"motors.pins: нужны ключи {sorted(DEFAULT_PINS)}")
+    for name, pin in pins.items():
+        _check_number(errors, f"motors.pins.{name}", pin, 0, 27, integer=True)
+    if len(set(pins.values())) != len(pins):
+        errors.append("motors.pins: пины должны различаться")
+    for name in ("speed", "min_speed", "max_speed"):
+        _check_number(errors, f"motors.{name}", motors[name], 0.0, 1.0)
+    if not errors and not motors["min_speed"] <= motors["speed"] <= motors["max_speed"]:
+        errors.append("motors: нужно min_speed <= speed <= max_speed")
+
+    if errors:
+        raise ValueError("; ".join(errors))
+    return config
+
+
+def updated(config, updates):
+    """
+    Новый конфиг = текущий + обновление, проверенный целиком.
+    Текущий конфиг не меняется; при ошибке - ValueError
+    """
+    if not isinstance(updates, dict):
+        raise ValueError("обновление конфига должно быть объектом")
+    new = merge(config, updates)
+    # Новые пределы скорости подтягивают текущую скорость, если её не задали явно
+    motors = new.get("motors")
+    if isinstance(motors, dict) and "speed" not in updates.get("motors", {}):
+        try:
+            motors["speed"] = min(max(motors["speed"], motors["min_speed"]), motors["max_speed"])
+        except (KeyError, TypeError):
+            pass  # Сообщит validate
+    return validate(new)
+
+
+def load_config(path=None):
+    """Конфиг по умолчанию, дополненный файлом (если он есть)"""
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    if path and os.path.exists(path):
+        with open(path) as f:
+            config = merge(config, json.load(f))
+    return validate(config)
+
+
+def save_config(config, path):
+    """Атомарная запись: конфиг на диске никогда не бывает наполовину записан"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def diff_sections(old, new):
+    """Какие разделы (и подразделы motors) изменились"""
+    changed = {section for section in new if new[section] != old.get(section)}
+    if "motors" in changed:
+        changed.discard("motors")
+        changed |= {f"motors.{key}" for key in new["motors"]
+                    if new["motors"][key] != old["motors"].get(key)}
+    return changed
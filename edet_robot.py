@@ -3,10 +3,22 @@ from gpiozero import Robot
 import json
 
 class RobotController:
-    def __init__(self):
+    def __init__(self, pins=None):
         # Инициализация робота с указанием пинов
-        self.robot = Robot(left=(12, 13), right=(19, 18))
+        if pins:
+            self.robot = Robot(left=(pins['left_forward'], pins['left_backward']),
+                               right=(pins['right_forward'], pins['right_backward']))
+        else:
+            self.robot = Robot(left=(12, 13), right=(19, 18))
         self.current_speed = 0.7  # Базовая скорость (0.0 до 1.0)
+    
+    def stop(self):
+        self.robot.stop()
+    
+    def cleanup(self):
+        """Остановка моторов и освобождение пинов"""
+        self.robot.stop()
+        self.robot.close()
         
     def execute_command(self, command):
         """Выполняет команду движения"""
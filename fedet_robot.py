@@ -11,11 +11,11 @@ import gpiod
 from gpiod.line import Direction
 
 class GPIODRobotController:
-    def __init__(self):
+    def __init__(self, pins=None):
         print("🤖 Инициализация робота через gpiod...")
         
         # GPIO пины (номера BCM)
-        self.pins = {
+        self.pins = dict(pins) if pins else {
             'left_forward': 12,
             'left_backward': 13,
             'right_forward': 19,
@@ -51,6 +51,10 @@ class GPIODRobotController:
             except Exception as e:
                 print(f"❌ Ошибка настройки пина {pin}: {e}")
         
+        self.configured_pins = set(self.lines)
+        if not self.configured_pins:
+            self.chip.close()
+            raise RuntimeError("gpiod: не настроен ни один пин")
         self.current_speed = 0.7
     
     def _set_motors(self, lf, lb, rf, rb):
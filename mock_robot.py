@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Контроллер моторов без железа: тот же интерфейс, что у RobotController,
+GPIODRobotController и SysfsRobotController, но «пины» живут в памяти.
+Каждая запись фиксируется с time.monotonic_ns(), по желанию с искусственной
+задержкой записи, чтобы имитировать медленный sysfs.
+
+Колёса моделируются апериодическим звеном: после записи скорость каждого
+колеса экспоненциально (постоянная времени tau_s) стремится к заданной
+(±current_speed). Так видно не только когда ушла команда «стоп», но и когда
+робот фактически остановился
+"""
+
+import math
+import time
+
+# Колесо считается остановившимся ниже этой доли от максимальной скорости
+REST_THRESHOLD = 0.02
+
+
+class MockRobotController:
+    def __init__(self, pins=None, write_latency_s=0.0, log_writes=True, tau_s=0.15):
+        print("🤖 Инициализация робота-имитатора (без GPIO)...")
+
+        self.pins = dict(pins) if pins else {
+            'left_forward': 12,
+            'left_backward': 13,
+            'right_forward': 19,
+            'right_backward': 18
+        }
+        self.state = {name: 0 for name in self.pins}
+        self.write_latency_s = write_latency_s
+        self.log_writes = log_writes
+        # (t_ns завершения записи, lf, lb, rf, rb, скорость)
+        self.writes = []
+        # (t_ns записи стоп, t_ns фактической остановки колёс по модели)
+        self.stops = []
+        self.current_speed = 0.7
+
+        self.tau_s = tau_s
+        # Скорости колёс (левое, правое) в момент последней записи и цель после неё
+        self._v0 = (0.0, 0.0)
+        self._target = (0.0, 0.0)
+        self._t_change_ns = time.monotonic_ns()
+
+    def wheel_velocity(self, t_ns=None):
+        """Модельные скорости колёс (доля от максимума) на момент t_ns"""
+        t_ns = time.monotonic_ns() if t_ns is None else t_ns
+        decay = math.exp(-max(t_ns - self._t_change_ns, 0) / 1e9 / self.tau_s)
+        return tuple(target + (v0 - target) * decay
+                     for v0, target in zip(self._v0, self._target))
+
+    def time_to_rest_s(self, velocity):
+        """Сколько колёса с такими скоростями будут тормозить до остановки"""
+        peak = max(abs(v) for v in velocity)
+        if peak <= REST_THRESHOLD:
+            return 0.0
+        return self.tau_s * math.log(peak / REST_THRESHOLD)
+
+    def _set_motors(self, lf, lb, rf, rb):
+        """Установка состояний моторов"""
+        if self.write_latency_s:
+            # Активное ожидание: sleep на малых интервалах слишком неточен
+            deadline = time.perf_counter() + self.write_latency_s
+            while time.perf_counter() < deadline:
+                pass
+        now = time.monotonic_ns()
+        self.state.update(left_forward=lf, left_backward=lb,
+                          right_forward=rf, right_backward=rb)
+
+        velocity = self.wheel_velocity(now)
+        self._v0 = velocity
+        self._target = ((lf - lb) * self.current_speed, (rf - rb) * self.current_speed)
+        self._t_change_ns = now
+        if self._target == (0, 0):
+            self.stops.append((now, now + int(self.time_to_rest_s(velocity) * 1e9)))
+
+        if self.log_writes:
+            self.writes.append((now, lf, lb, rf, rb, self.current_speed))
+
+    def forward(self):
+        self._set_motors(1, 0, 1, 0)
+
+    def backward(self):
+        self._set_motors(0, 1, 0, 1)
+
+    def left(self):
+        self._set_motors(0, 1, 1, 0)
+
+    def right(self):
+        self._set_motors(1, 0, 0, 1)
+
+    def stop(self):
+        self._set_motors(0, 0, 0, 0)
+
+    def execute_command(self, command):
+        """Выполняет команду движения"""
+        try:
+            if command == "forward":
+                self.forward()
+                print("🔼 ВПЕРЕД")
+            elif command == "backward":
+                self.backward()
+                print("🔽 НАЗАД")
+            elif command == "left":
+                self.left()
+                print("↩️  ВЛЕВО")
+            elif command == "right":
+                self.right()
+                print("↪️  ВПРАВО")
+            elif command == "stop":
+                self.stop()
+                print("⏹️  СТОП")
+            elif command.startswith("speed:"):
+                new_speed = float(command.split(":")[1])
+                if 0.1 <= new_speed <= 1.0:
+                    self.current_speed = new_speed
+                    print(f"🎚️  Скорость: {new_speed}")
+                else:
+                    print(f"❌ Некорректная скорость: {new_speed}")
+            else:
+                print(f"❌ Неизвестная команда: {command}")
+        except Exception as e:
+            print(f"❌ Ошибка: {e}")
+
+    def cleanup(self):
+        """Очистка ресурсов"""
+        self.stop()
+        print("🧹 Имитатор остановлен")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Автоматическая характеристика тракта управления моторами.
+
+Вместо sleep(2) и наблюдения глазами (test_motor.py, motor_test.py) команды
+выдаются по точному расписанию через execute_command любого бэкенда, и для
+каждой фиксируются time.monotonic_ns():
+    scheduled - когда команда должна была уйти
+    issued    - когда она фактически ушла в контроллер
+    done      - когда запись в GPIO/PWM завершилась (возврат из контроллера)
+Отчёт (JSON): задержка выдачи, время записи, джиттер и фактическая длительность
+каждого участка профиля против заданной.
+
+На машине разработчика:
+    python motor_bench.py --backend mock
+Как регрессионный тест:
+    python motor_bench.py --backend mock --baseline bench.json --tolerance 1.5
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import sys
+import time
+
+from motors import BACKENDS, MOCK_BACKEND, create_controller
+
+# (команда, сколько держать состояние, с)
+STEP_PROFILE = [
+    ("forward", 0.5), ("stop", 0.25),
+    ("backward", 0.5), ("stop", 0.25),
+    ("left", 0.3), ("stop", 0.25),
+    ("right", 0.3), ("stop", 0.25),
+]
+
+
+def ramp_profile(start=0.1, end=1.0, steps=10, step_s=0.2):
+    """Плавный разгон вперёд: смена скорости и сразу команда движения"""
+    profile = []
+    for i in range(steps):
+        speed = start + (end - start) * i / max(steps - 1, 1)
+        profile.append((f"speed:{speed:.2f}", 0.0))
+        profile.append(("forward", step_s))
+    profile.append(("stop", 0.25))
+    return profile
+
+
+PROFILES = {
+    "step": lambda: STEP_PROFILE,
+    "ramp": ramp_profile,
+}
+
+
+def wait_until(t_ns, spin_ns=2_000_000):
+    """Сон до момента t_ns: обычный sleep, последние 2 мс - активное ожидание"""
+    remaining = t_ns - time.monotonic_ns()
+    if remaining > spin_ns:
+        time.sleep((remaining - spin_ns) / 1e9)
+    while time.monotonic_ns() < t_ns:
+        pass
+
+
+def run_profile(controller, profile, lead_s=0.05):
+    """Выполняет профиль; возвращает список замеров по командам"""
+    samples = []
+    t_ns = time.monotonic_ns() + int(lead_s * 1e9)
+    # Вывод контроллеров (эмодзи в терминал) не должен влиять на замер
+    with contextlib.redirect_stdout(io.StringIO()):
+        for command, hold_s in profile:
+            wait_until(t_ns)
+            issued = time.monotonic_ns()
+            controller.execute_command(command)
+            done = time.monotonic_ns()
+            samples.append({
+                "command": command,
+                "hold_s": hold_s,
+                "scheduled_ns": t_ns,
+                "issued_ns": issued,
+                "done_ns": done
+            })
+            t_ns += int(hold_s * 1e9)
+    return samples
+
+
+def summary_us(values_ns):
+    """Сводка в микросекундах"""
+    if not values_ns:
+        return None
+    values = sorted(v / 1000 for v in values_ns)
+
+    def pct(p):
+        return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+    return {
+        "n": len(values),
+        "mean": round(statistics.fmean(values), 1),
+        "p50": round(pct(50), 1),
+        "p95": round(pct(95), 1),
+        "p99": round(pct(99), 1),
+        "max": round(values[-1], 1),
+        "stdev": round(statistics.pstdev(values), 1)
+    }
+
+
+def segments_of(samples):
+    """Участки: состояние держится от завершения записи до завершения следующей"""
+    segments = []
+    for current, following in zip(samples, samples[1:]):
+        if current["hold_s"] <= 0:
+            continue  # Смена скорости сама по себе состояние не держит
+        achieved_ns = following["done_ns"] - current["done_ns"]
+        nominal_ns = int(current["hold_s"] * 1e9)
+        segments.append({
+            "command": current["command"],
+            "nominal_ms": nominal_ns / 1e6,
+            "achieved_ms": round(achieved_ns / 1e6, 3),
+            "error_us": round((achieved_ns - nominal_ns) / 1000, 1)
+        })
+    return segments
+
+
+def analyze(runs):
+    """Сводка по нескольким прогонам одного профиля"""
+    samples = [s for run in runs for s in run]
+    dispatch = [s["issued_ns"] - s["scheduled_ns"] for s in samples]
+    write = [s["done_ns"] - s["issued_ns"] for s in samples]
+    # Границы прогонов не участки профиля, поэтому участки считаются по прогонам
+    segments = [segments_of(run) for run in runs]
+    errors = [abs(seg["error_us"]) * 1000 for run in segments for seg in run]
+
+    return {
+        "runs": len(runs),
+        "commands": len(samples),
+        "dispatch_latency_us": summary_us(dispatch),
+        "write_latency_us": summary_us(write),
+        # Джиттер фронтов: отклонение длительности участков от заданной
+        "segment_error_us": summary_us(errors),
+        "segments": segments[0] if segments else []
+    }
+
+
+def characterize(controller, profiles=("step", "ramp"), repeat=3):
+    report = {"profiles": {}}
+    for name in profiles:
+        runs = [run_profile(controller, PROFILES[name]()) for _ in range(repeat)]
+        report["profiles"][name] = analyze(runs)
+    return report
+
+
+def check_baseline(report, baseline, tolerance):
+    """Сравнение p99 с эталонным отчётом; возвращает список регрессий"""
+    regressions = []
+    for name, result in report["profiles"].items():
+        base = baseline.get("profiles", {}).get(name)
+        if not base:
+            continue
+        for metric in ("dispatch_latency_us", "write_latency_us", "segment_error_us"):
+            if not result.get(metric) or not base.get(metric):
+                continue
+            # Нижняя граница 50 мкс, чтобы не ловить шум на микросекундах
+            limit = max(base[metric]["p99"] * tolerance, 50.0)
+            if result[metric]["p99"] > limit:
+                regressions.append(
+                    f"{name}.{metric}.p99 = {result[metric]['p99']} мкс > {limit:.1f} мкс"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Характеристика тракта управления моторами")
+    parser.add_argument("--backend", choices=BACKENDS + (MOCK_BACKEND,), default=MOCK_BACKEND)
+    parser.add_argument("--profile", choices=tuple(PROFILES) + ("all",), default="all")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="файл для JSON отчёта (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="эталонный JSON отчёт для сравнения")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="допустимый рост p99 относительно эталона")
+    args = parser.parse_args()
+
+    profiles = tuple(PROFILES) if args.profile == "all" else (args.profile,)
+    if args.backend != MOCK_BACKEND:
+        print("⚠️  Реальные моторы! Колёса должны быть подняты над поверхностью.",
+              file=sys.stderr)
+
+    # Сообщения контроллера - в stderr, stdout остаётся чистым JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        controller = create_controller(args.backend)
+    try:
+        report = characterize(controller, profiles, args.repeat)
+    finally:
+        with contextlib.redirect_stdout(sys.stderr):
+            controller.cleanup()
+    report["backend"] = args.backend
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = check_baseline(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"❌ Регрессия: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("✅ Регрессий нет", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Выбор контроллера моторов. Все контроллеры имеют общий интерфейс:
+execute_command(command), stop(), cleanup() и current_speed.
+Контроллеры, которые переживают ошибки отдельных пинов (sysfs, gpiod),
+сообщают настроенные в configured_pins
+"""
+
+from startup import load_state, save_state
+
+# Реальные бэкенды в порядке автоподбора
+BACKENDS = ("gpiozero", "gpiod", "sysfs")
+# Имитатор выбирается только явно, автоподбор его не трогает
+MOCK_BACKEND = "mock"
+
+
+def create_controller(backend, pins=None):
+    """Создаёт контроллер моторов для указанного бэкенда"""
+    # Импорты внутри, чтобы не тянуть недоступные GPIO библиотеки
+    if backend == "gpiozero":
+        from edet_robot import RobotController
+        return RobotController(pins)
+    if backend == "gpiod":
+        from fedet_robot import GPIODRobotController
+        return GPIODRobotController(pins)
+    if backend == "sysfs":
+        from sys_robot import SysfsRobotController
+        return SysfsRobotController(pins)
+    if backend == MOCK_BACKEND:
+        from mock_robot import MockRobotController
+        return MockRobotController(pins)
+    raise ValueError(f"Неизвестный бэкенд моторов: {backend}")
+
+
+def missing_pins(controller):
+    """Пины, которые контроллер не смог настроить"""
+    configured = getattr(controller, "configured_pins", None)
+    if configured is None:
+        return set()  # gpiozero и имитатор при ошибке падают в конструкторе
+    return set(controller.pins) - set(configured)
+
+
+def create_controller_auto(pins=None):
+    """
+    Подбирает рабочий бэкенд: сначала сохранённый в кэше, затем по порядку.
+    Возвращает (backend, controller)
+    """
+    cached = load_state().get("gpio_backend")
+    candidates = [cached] if cached in BACKENDS else []
+    candidates += [b for b in BACKENDS if b != cached]
+
+    for backend in candidates:
+        try:
+            controller = create_controller(backend, pins)
+        except Exception as e:
+            print(f"⚠️  Бэкенд {backend} недоступен: {e}")
+            continue
+        missing = missing_pins(controller)
+        if missing:
+            # Частично рабочий бэкенд не выбираем и не кэшируем
+            print(f"⚠️  Бэкенд {backend} не настроил пины {sorted(missing)}")
+            try:
+                controller.cleanup()
+            except Exception as e:
+                print(f"⚠️  Ошибка освобождения {backend}: {e}")
+            continue
+        if backend != cached:
+            save_state({"gpio_backend": backend})
+        return backend, controller
+    if cached is not None:
+        # Кэш больше не верен: следующий запуск снова переберёт все бэкенды
+        save_state({"gpio_backend": None})
+    raise RuntimeError("Ни один GPIO бэкенд не доступен")
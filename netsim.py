@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная проверка канала команд без железа.
+
+В одном процессе поднимаются:
+  * CommandServer поверх MockRobotController (модель колёс, см. mock_robot.py)
+  * ImpairedLink - прокси ROUTER/DEALER между клиентами и сервером, который
+    добавляет задержку, джиттер, потери и переупорядочивание (как netem)
+  * N клиентов REQ с заданной частотой команд; потерянный ответ - таймаут,
+    сокет пересоздаётся (REQ после таймаута непригоден), та же команда
+    повторяется до max_attempts раз, затем считается неудавшейся
+  * клиент «аварийный стоп»: раз в stop_interval шлёт stop и повторяет до ответа
+
+Отчёт (JSON) по каждому сценарию: подтверждённых команд/с, перцентили
+задержки команды от первой отправки до ответа (с повторами) и на сервере,
+таймауты попыток, повторённые и неудавшиеся команды, статистика прокси и
+время аварийной остановки: до записи в моторы, до ответа клиенту и до
+фактической остановки колёс по модели.
+
+    python netsim.py                                  # все сценарии
+    python netsim.py --scenario lossy --clients 10 --rate 20 --duration 10
+
+Всё работает в потоках одного процесса на общей шкале time.monotonic_ns,
+поэтому абсолютные цифры включают конкуренцию за GIL; сравнивать стоит
+сценарии между собой.
+"""
+
+import argparse
+import contextlib
+import heapq
+import io
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+
+import zmq
+
+from command_server import CommandServer
+from mock_robot import MockRobotController
+from motor_bench import summary_us
+
+# Параметры канала: задержка и джиттер (мс) в каждую сторону, доли потерь и переупорядочивания
+SCENARIOS = {
+    "ideal": {"latency_ms": 0, "jitter_ms": 0, "loss": 0.0, "reorder": 0.0},
+    "wifi": {"latency_ms": 5, "jitter_ms": 3, "loss": 0.01, "reorder": 0.0},
+    "congested": {"latency_ms": 40, "jitter_ms": 30, "loss": 0.05, "reorder": 0.05},
+    "lossy": {"latency_ms": 10, "jitter_ms": 5, "loss": 0.30, "reorder": 0.02},
+}
+
+# Нагрузка без stop: каждый stop на сервере - от клиента аварийной остановки
+LOAD_COMMANDS = ("forward", "backward", "left", "right", "speed:0.50", "speed:0.90")
+
+
+class ImpairedLink:
+    """
+    Прокси с ухудшением канала. Клиенты подключаются к ROUTER (front_port),
+    прокси передаёт конверт как есть через DEALER на REP-сервер.
+    Каждое сообщение в каждую сторону независимо:
+      * теряется с вероятностью loss
+      * с вероятностью reorder уходит сразу, обгоняя задержанные (как netem)
+      * иначе задерживается на latency ± jitter
+    """
+
+    def __init__(self, backend_address, latency_ms=0, jitter_ms=0, loss=0.0, reorder=0.0,
+                 context=None, seed=None):
+        self.latency_s = latency_ms / 1000
+        self.jitter_s = jitter_ms / 1000
+        self.loss = loss
+        self.reorder = reorder
+        self.random = random.Random(seed)
+
+        self.context = context if context is not None else zmq.Context.instance()
+        self.front = self.context.socket(zmq.ROUTER)
+        self.front.setsockopt(zmq.LINGER, 0)
+        self.front_port = self.front.bind_to_random_port("tcp://127.0.0.1")
+        self.back = self.context.socket(zmq.DEALER)
+        self.back.setsockopt(zmq.LINGER, 0)
+        self.back.connect(backend_address)
+
+        # (момент отправки, порядковый номер, сокет, кадры)
+        self._delayed = []
+        self._seq = itertools.count()
+        self.forwarded = 0
+        self.dropped = 0
+        self.reordered = 0
+
+    @property
+    def address(self):
+        return f"tcp://127.0.0.1:{self.front_port}"
+
+    def _schedule(self, socket, frames, now):
+        if self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        if self.reorder and self.random.random() < self.reorder:
+            self.reordered += 1
+            due = now
+        else:
+            jitter = self.random.uniform(-self.jitter_s, self.jitter_s)
+            due = now + max(self.latency_s + jitter, 0.0)
+        heapq.heappush(self._delayed, (due, next(self._seq), socket, frames))
+
+    def _release(self, now):
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, socket, frames = heapq.heappop(self._delayed)
+            try:
+                socket.send_multipart(frames, zmq.NOBLOCK)
+                self.forwarded += 1
+            except zmq.Again:
+                self.dropped += 1
+
+    def run(self, stop_event):
+        poller = zmq.Poller()
+        poller.register(self.front, zmq.POLLIN)
+        poller.register(self.back, zmq.POLLIN)
+
+        try:
+            while not stop_event.is_set():
+                # Спим до ближайшей задержанной отправки, но не дольше 100 мс
+                timeout_ms = 100
+                if self._delayed:
+                    timeout_ms = max(0, min(timeout_ms, (self._delayed[0][0] - time.monotonic()) * 1000))
+                events = dict(poller.poll(timeout_ms))
+
+                now = time.monotonic()
+                if self.front in events:
+                    self._schedule(self.back, self.front.recv_multipart(), now)
+                if self.back in events:
+                    self._schedule(self.front, self.back.recv_multipart(), now)
+                self._release(time.monotonic())
+        finally:
+            self.front.close()
+            self.back.close()
+
+    def stats(self):
+        return {
+            "forwarded": self.forwarded,
+            "dropped": self.dropped,
+            "reordered": self.reordered
+        }
+
+
+class LoadClient:
+    """REQ-клиент с фиксированной частотой команд и повтором по таймауту"""
+
+    def __init__(self, context, address, rate, timeout_s=0.25, max_attempts=3, seed=None):
+        self.context = context
+        self.address = address
+        self.interval_s = 1.0 / rate
+        self.timeout_ms = int(timeout_s * 1000)
+        self.max_attempts = max_attempts
+        self.random = random.Random(seed)
+        self.socket = None
+
+        self.sent = 0       # Попыток (с повторами)
+        self.timeouts = 0   # Попыток без ответа
+        self.ok = 0         # Подтверждённых команд
+        self.retried = 0    # Из них подтверждённых не с первой попытки
+        self.failed = 0     # Команд без ответа после max_attempts
+        self.rtt_ns = []    # От первой отправки команды до ответа
+        self.server_ns = []
+
+    def _connect(self):
+        if self.socket is not None:
+            self.socket.close()
+        self.socket = self.context.socket(zmq.REQ)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.setsockopt(zmq.RCVTIMEO, self.timeout_ms)
+        self.socket.connect(self.address)
+
+    def request(self, command):
+        """Одна попытка: ответ сервера или None по таймауту"""
+        self.socket.send_string(command)
+        self.sent += 1
+        try:
+            response = json.loads(self.socket.recv_string())
+        except zmq.Again:
+            # Ответ (или запрос) потерян: REQ застрял в ожидании, нужен новый сокет
+            self.timeouts += 1
+            self._connect()
+            return None
+        if "t_done_ns" in response:
+            self.server_ns.append(response["t_done_ns"] - response["t_recv_ns"])
+        return response
+
+    def command(self, command, stop_event):
+        """
+        Команда с повторами. Возвращает (ответ, номер попытки, t_ns первой
+        отправки); ответ None - все попытки потеряны или остановка прогона
+        """
+        t_first = time.monotonic_ns()
+        for attempt in range(1, self.max_attempts + 1):
+            if stop_event.is_set():
+                return None, attempt, t_first
+            response = self.request(command)
+            if response is None:
+                continue
+            self.ok += 1
+            self.retried += attempt > 1
+            self.rtt_ns.append(time.monotonic_ns() - t_first)
+            return response, attempt, t_first
+        self.failed += 1
+        return None, self.max_attempts, t_first
+
+    def run(self, stop_event):
+        self._connect()
+        # Случайная фаза, чтобы клиенты не стреляли одновременно
+        next_due = time.monotonic() + self.random.uniform(0, self.interval_s)
+        try:
+            while not stop_event.is_set():
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    stop_event.wait(delay)
+                    continue
+                self.command(self.random.choice(LOAD_COMMANDS), stop_event)
+                # Без накопления долга: REQ синхронный, медленный канал снижает частоту
+                next_due = max(next_due + self.interval_s, time.monotonic())
+        finally:
+            self.socket.close()
+
+
+class EmergencyStopClient(LoadClient):
+    """Оператор жмёт «стоп» раз в interval_s и повторяет, пока не получит ответ"""
+
+    def __init__(self, context, address, controller, interval_s=1.0, timeout_s=0.25,
+                 max_attempts=10):
+        super().__init__(context, address, 1.0 / interval_s, timeout_s, max_attempts)
+        self.controller = controller
+        self.stops = []
+
+    def _rest_ns(self, response):
+        """Момент остановки колёс по модели для записи stop из этого ответа"""
+        for t_write, t_rest in reversed(self.controller.stops):
+            if response["t_recv_ns"] <= t_write <= response["t_done_ns"]:
+                return t_rest
+        return None
+
+    def emergency_stop(self, stop_event):
+        response, attempt, t_press = self.command("stop", stop_event)
+        if response is None:
+            return
+        t_rest = self._rest_ns(response)
+        self.stops.append({
+            "attempts": attempt,
+            "motors_ns": response["t_done_ns"] - t_press,
+            "ack_ns": self.rtt_ns[-1],
+            "rest_ns": t_rest - t_press if t_rest is not None else None
+        })
+
+    def run(self, stop_event):
+        self._connect()
+        try:
+            # Первое нажатие через полинтервала: нагрузка уже успевает разогнать колёса
+            while not stop_event.wait(self.interval_s / 2):
+                self.emergency_stop(stop_event)
+                stop_event.wait(self.interval_s / 2)
+        finally:
+            self.socket.close()
+
+    def stats(self):
+        def pick(key):
+            return [s[key] for s in self.stops if s[key] is not None]
+
+        return {
+            "presses": len(self.stops) + self.failed,
+            "lost": self.failed,
+            "retried": self.retried,
+            "to_motors_us": summary_us(pick("motors_ns")),
+            "to_ack_us": summary_us(pick("ack_ns")),
+            "to_rest_us": summary_us(pick("rest_ns"))
+        }
+
+
+def run_scenario(name, link, clients=10, rate=20.0, duration_s=10.0, port=5656,
+                 timeout_s=0.25, stop_interval_s=1.0, seed=0, max_attempts=3):
+    """Прогон одного сценария; возвращает отчёт"""
+    context = zmq.Context()
+    stop_event = threading.Event()
+    server_stop = threading.Event()
+
+    # Сообщения контроллера и сервера (эмодзи на каждую команду) не нужны в отчёте
+    with contextlib.redirect_stdout(io.StringIO()):
+        controller = MockRobotController(log_writes=False)
+        server = CommandServer(controller, port=port, context=context)
+    proxy = ImpairedLink(f"tcp://127.0.0.1:{port}", context=context, seed=seed, **link)
+
+    load = [LoadClient(context, proxy.address, rate, timeout_s, max_attempts, seed=seed + i)
+            for i in range(clients)]
+    estop = EmergencyStopClient(context, proxy.address, controller, stop_interval_s, timeout_s)
+
+    def serve():
+        with contextlib.redirect_stdout(io.StringIO()):
+            server.serve(server_stop, poll_ms=10)
+
+    threads = [threading.Thread(target=serve, daemon=True),
+               threading.Thread(target=proxy.run, args=(server_stop,), daemon=True)]
+    threads += [threading.Thread(target=c.run, args=(stop_event,), daemon=True)
+                for c in load + [estop]]
+
+    print(f"▶️  {name}: {clients} клиентов × {rate} ком/с, {duration_s} с, канал {link}",
+          file=sys.stderr)
+    for thread in threads:
+        thread.start()
+    t_start = time.monotonic()
+    time.sleep(duration_s)
+    stop_event.set()
+    for thread in threads[2:]:
+        thread.join(timeout=2.0)
+    elapsed = time.monotonic() - t_start
+    # Сервер и прокси останавливаем последними, чтобы не обрывать ответы клиентам
+    server_stop.set()
+    for thread in threads[:2]:
+        thread.join(timeout=2.0)
+    context.term()
+
+    ok = sum(c.ok for c in load)
+    return {
+        "scenario": name,
+        "link": link,
+        "clients": clients,
+        "rate_per_client": rate,
+        "duration_s": round(elapsed, 2),
+        "commands_per_s": round(ok / elapsed, 1),
+        "sent": sum(c.sent for c in load),
+        "ok": ok,
+        "timeouts": sum(c.timeouts for c in load),
+        "retried": sum(c.retried for c in load),
+        "failed": sum(c.failed for c in load),
+        "latency_us": summary_us([v for c in load for v in c.rtt_ns]),
+        "server_us": summary_us([v for c in load for v in c.server_ns]),
+        "proxy": proxy.stats(),
+        "server_commands": server.command_count,
+        "emergency_stop": estop.stats()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка канала команд на имитаторе")
+    parser.add_argument("--scenario", choices=tuple(SCENARIOS) + ("all",), default="all")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=20.0, help="команд/с на клиента")
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд на сценарий")
+    parser.add_argument("--timeout", type=float, default=0.25, help="таймаут ответа, с")
+    parser.add_argument("--attempts", type=int, default=3,
+                        help="попыток на команду нагрузки до признания её неудавшейся")
+    parser.add_argument("--stop-interval", type=float, default=1.0,
+                        help="период аварийных остановок, с")
+    parser.add_argument("--port", type=int, default=5656, help="порт сервера команд")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл для JSON отчёта (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    names = tuple(SCENARIOS) if args.scenario == "all" else (args.scenario,)
+    report = [
+        run_scenario(name, SCENARIOS[name], args.clients, args.rate, args.duration,
+                     args.port, args.timeout, args.stop_interval, args.seed, args.attempts)
+        for name in names
+    ]
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
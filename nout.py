@@ -1,15 +1,28 @@
 import cv2
 import zmq
-import base64
+import json
 import numpy as np
+import threading
 import time
 
+from avi_writer import MjpegAviWriter
+from protocol import unpack_frame, topic_prefix
+
+ROI_TOPIC = "roi"
+
 class VideoReceiver:
-    def __init__(self, host='192.168.1.138', port=5555):  # ЗАМЕНИТЕ НА IP РОБОТА!
+    def __init__(self, host='192.168.1.138', port=5555, record_path=None,  # ЗАМЕНИТЕ НА IP РОБОТА!
+                 fps=None, hwm=2, policy="drop_oldest", topic="lo", control_port=5558):
         self.host = host
         self.port = port
+        # Вариант потока робота: "lo" - быстрый для управления, "hi" - чёткий
+        self.topic = topic
+        # fps задан: подключаемся к ROUTER порту relay.py и просим свою частоту
+        self.relay_request = {"fps": fps, "hwm": hwm, "policy": policy,
+                              "topic": topic} if fps else None
+        self.last_request = 0.0
         self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.SUB)
+        self.socket = self.context.socket(zmq.DEALER if self.relay_request else zmq.SUB)
         self.socket.setsockopt(zmq.CONFLATE, 1)
         
         # Таймаут на прием
@@ -17,34 +30,175 @@ class VideoReceiver:
         
         print(f"Подключение к {self.host}:{self.port}...")
         self.socket.connect(f"tcp://{self.host}:{self.port}")
-        self.socket.setsockopt_string(zmq.SUBSCRIBE, '')
+        if self.relay_request:
+            self._send_relay_request()
+        else:
+            self.socket.setsockopt(zmq.SUBSCRIBE, topic_prefix(self.topic))
+        
+        # Область интереса: запросы уходят роботу напрямую (не через relay.py),
+        # кадры приходят отдельным топиком в своё окно
+        self.control = None
+        self.roi_socket = None
+        # Активный запрос области; повторяется, пока окно ROI открыто (аренда у робота)
+        self.roi_request = None
+        self.last_roi_request = 0.0
+        if not self.relay_request:
+            self.control = self.context.socket(zmq.PUSH)
+            self.control.setsockopt(zmq.LINGER, 0)
+            self.control.setsockopt(zmq.SNDHWM, 4)
+            self.control.connect(f"tcp://{self.host}:{control_port}")
+            self.roi_socket = self.context.socket(zmq.SUB)
+            self.roi_socket.setsockopt(zmq.CONFLATE, 1)
+            self.roi_socket.connect(f"tcp://{self.host}:{self.port}")
+        
+        self.poller = zmq.Poller()
+        self.poller.register(self.socket, zmq.POLLIN)
+        if self.roi_socket is not None:
+            self.poller.register(self.roi_socket, zmq.POLLIN)
+        self._drag_start = None
+        self._display_size = None
         
         self.frame_count = 0
+        self.writer = None
+        self._closing = []  # Потоки, дописывающие остановленные записи
+        if record_path:
+            self.start_recording(record_path)
         
+    def start_recording(self, path=None):
+        """Запись принятых JPEG как есть (без перекодирования) в MJPEG AVI"""
+        if self.writer:
+            return
+        if path is None:
+            path = time.strftime("robot_%Y%m%d_%H%M%S.avi")
+        self.writer = MjpegAviWriter(path)
+        print(f"⏺️  Запись в {path}")
+    
+    def stop_recording(self, wait=False):
+        """Дописывание очереди и индекса идёт в фоне, чтобы не тормозить показ"""
+        if self.writer:
+            writer, self.writer = self.writer, None
+            thread = threading.Thread(target=self._finish_recording, args=(writer,),
+                                      name="avi_close")
+            thread.start()
+            self._closing.append(thread)
+        self._closing = [t for t in self._closing if t.is_alive()]
+        if wait:
+            # При выходе файлы должны быть дописаны: поток записи - daemon
+            for thread in self._closing:
+                thread.join()
+
+    def _finish_recording(self, writer):
+        writer.close()
+        print(f"⏹️  Запись остановлена: {writer.frames_written} кадров, "
+              f"пропущено {writer.frames_dropped}")
+    
+    def _send_relay_request(self):
+        """Запрос частоты у ретранслятора; повторяется как heartbeat"""
+        self.socket.send_string(json.dumps(self.relay_request), zmq.NOBLOCK)
+        self.last_request = time.monotonic()
+    
+    def request_roi(self, rect, width=320, height=240, quality=85, fps=15):
+        """
+        Просит робота кодировать только область rect = (x, y, w, h)
+        в долях кадра из полного разрешения; None - отключить
+        """
+        if self.control is None:
+            print("❌ Область интереса доступна только при прямом подключении к роботу")
+            return
+        if rect is None:
+            request = {"roi": None}
+            if self.roi_request:
+                self.roi_socket.setsockopt(zmq.UNSUBSCRIBE, topic_prefix(ROI_TOPIC))
+                cv2.destroyWindow('ROI')
+            self.roi_request = None
+        else:
+            request = {"roi": {"rect": list(rect), "width": width, "height": height,
+                               "quality": quality, "fps": fps}}
+            if not self.roi_request:
+                self.roi_socket.setsockopt(zmq.SUBSCRIBE, topic_prefix(ROI_TOPIC))
+            self.roi_request = request
+        self._send_control(request)
+
+    def _send_control(self, request):
+        self.last_roi_request = time.monotonic()
+        try:
+            self.control.send_string(json.dumps(request), zmq.NOBLOCK)
+        except zmq.Again:
+            print("❌ Робот не принимает запросы управления")
+    
+    def _on_mouse(self, event, x, y, flags, param):
+        """Выделение мышью - область интереса, правая кнопка - сброс"""
+        if event == cv2.EVENT_LBUTTONDOWN:
+            self._drag_start = (x, y)
+        elif event == cv2.EVENT_LBUTTONUP and self._drag_start and self._display_size:
+            (x0, y0), (w, h) = self._drag_start, self._display_size
+            self._drag_start = None
+            if abs(x - x0) > 4 and abs(y - y0) > 4:
+                self.request_roi((min(x, x0) / w, min(y, y0) / h,
+                                  abs(x - x0) / w, abs(y - y0) / h))
+        elif event == cv2.EVENT_RBUTTONDOWN:
+            self.request_roi(None)
+    
+    def _show_roi(self):
+        _, _, jpg_original = unpack_frame(self.roi_socket.recv())
+        frame = cv2.imdecode(np.frombuffer(jpg_original, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is not None:
+            cv2.imshow('ROI', frame)
+    
     def start_receiver(self):
         print("Ожидание видео потока...")
+        cv2.namedWindow('Video Stream')
+        if self.control is not None:
+            cv2.setMouseCallback('Video Stream', self._on_mouse)
         
         try:
             while True:
                 try:
                     # Получение данных с таймаутом
-                    jpg_as_text = self.socket.recv()
+                    if self.relay_request and time.monotonic() - self.last_request > 2.0:
+                        self._send_relay_request()
+                    if self.roi_request and time.monotonic() - self.last_roi_request > 2.0:
+                        self._send_control(self.roi_request)
+                    
+                    events = dict(self.poller.poll(5000))
+                    if not events:
+                        raise zmq.Again()
+                    if self.roi_socket in events:
+                        self._show_roi()
+                    if self.socket not in events:
+                        # Пришёл только кадр области интереса
+                        if cv2.waitKey(1) & 0xFF == ord('q'):
+                            break
+                        continue
+                    
+                    message = self.socket.recv()
+                    t_recv_ns = time.monotonic_ns()
                     
                     # Декодирование
-                    jpg_original = base64.b64decode(jpg_as_text)
+                    frame_id, t_capture_ns, jpg_original = unpack_frame(message)
+                    if self.writer:
+                        # Только постановка в очередь, запись в фоне
+                        self.writer.write(jpg_original, t_capture_ns, t_recv_ns, frame_id)
                     jpg_as_np = np.frombuffer(jpg_original, dtype=np.uint8)
                     frame = cv2.imdecode(jpg_as_np, cv2.IMREAD_COLOR)
                     
                     if frame is not None:
                         self.frame_count += 1
+                        self._display_size = (frame.shape[1], frame.shape[0])
                         cv2.imshow('Video Stream', frame)
                         
                         if self.frame_count % 30 == 0:
                             print(f"Получено кадров: {self.frame_count}")
                     
-                    # Выход по 'q'
-                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                    # Выход по 'q', запись по 'r'
+                    key = cv2.waitKey(1) & 0xFF
+                    if key == ord('q'):
                         break
+                    if key == ord('r'):
+                        if self.writer:
+                            self.stop_recording()
+                        else:
+                            self.start_recording()
                         
                 except zmq.Again:
                     print("Таймаут: нет данных от сервера")
@@ -61,6 +215,10 @@ class VideoReceiver:
             self.cleanup()
     
     def cleanup(self):
+        self.stop_recording(wait=True)
+        if self.control is not None:
+            self.control.close()
+            self.roi_socket.close()
         self.socket.close()
         self.context.term()
         cv2.destroyAllWindows()
@@ -0,0 +1,39 @@
+"""
+Формат видеосообщения PUB/SUB:
+    b"<topic> <frame_id> <t_capture_ns> <jpeg в base64>"
+
+Одна часть (а не multipart), потому что приёмник использует zmq.CONFLATE.
+Топик идёт первым, чтобы SUB мог фильтровать по префиксу b"<topic> ".
+Base64 не содержит пробелов, поэтому заголовок отделяется однозначно.
+Старые форматы тоже распознаются: без топика (topic = None) и
+только base64 (frame_id и t_ns = None).
+"""
+
+import base64
+
+
+def pack_frame(jpeg, frame_id, t_ns, topic=""):
+    header = b"%d %d " % (frame_id, t_ns)
+    if topic:
+        header = topic.encode() + b" " + header
+    return header + base64.b64encode(jpeg)
+
+
+def unpack_frame(message):
+    """Возвращает (frame_id, t_capture_ns, jpeg bytes)"""
+    return unpack_frame_topic(message)[1:]
+
+
+def unpack_frame_topic(message):
+    """Возвращает (topic, frame_id, t_capture_ns, jpeg bytes)"""
+    parts = message.split(b" ", 3)
+    if len(parts) == 4:
+        return parts[0].decode(), int(parts[1]), int(parts[2]), base64.b64decode(parts[3])
+    if len(parts) == 3:
+        return None, int(parts[0]), int(parts[1]), base64.b64decode(parts[2])
+    return None, None, None, base64.b64decode(message)
+
+
+def topic_prefix(topic):
+    """Префикс подписки для топика ('' - все топики)"""
+    return topic.encode() + b" " if topic else b""
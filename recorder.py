@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Бортовой самописец: JPEG кадры и принятые команды пишутся в append-only
+сегменты фиксированной длительности с индексом для поиска по времени за O(1).
+
+Структура каталога записи:
+    recording.json      - start_ns, длительность сегмента, шаг индекса
+    seg_000000.dat      - MAGIC, затем записи RECORD_HEADER + payload
+    seg_000000.idx      - для каждого шага индекса смещение первой записи (<Q)
+
+Сегмент k покрывает [start_ns + k * segment_ns, start_ns + (k + 1) * segment_ns),
+поэтому нужный сегмент и позиция в нём вычисляются без поиска.
+
+Воспроизведение:
+    python recorder.py DIR [--port 5555] [--from SEC] [--speed 1.0]
+"""
+
+import argparse
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+
+MAGIC = b"RBSEG001"
+RECORD_HEADER = struct.Struct("<BqI")  # тип, t_ns, длина payload
+INDEX_ENTRY = struct.Struct("<Q")
+
+RECORD_FRAME = 1
+RECORD_COMMAND = 2
+
+
+class FlightRecorder:
+    def __init__(self, path, segment_s=60, index_step_ms=100,
+                 max_buffer_bytes=8 * 1024 * 1024, flush_interval=1.0):
+        self.path = path
+        self.segment_ns = int(segment_s * 1e9)
+        self.index_step_ns = int(index_step_ms * 1e6)
+        self.max_buffer_bytes = max_buffer_bytes
+        self.flush_interval = flush_interval
+
+        os.makedirs(path, exist_ok=True)
+        self.start_ns = time.monotonic_ns()
+        with open(os.path.join(path, "recording.json"), "w") as f:
+            json.dump({
+                "start_ns": self.start_ns,
+                "start_wall": time.time(),
+                "segment_ns": self.segment_ns,
+                "index_step_ns": self.index_step_ns
+            }, f, indent=2)
+
+        # Очередь без лимита по числу элементов, память ограничена
+        # по байтам кадров; команды маленькие и принимаются всегда
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending_bytes = 0
+
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.commands_written = 0
+
+        self._segment = None
+        self._data = None
+        self._index = None
+        self._offset = 0
+        self._last_bucket = -1
+
+        self._thread = threading.Thread(target=self._writer, name="recorder", daemon=True)
+        self._thread.start()
+
+    def record_frame(self, jpeg, t_ns):
+        """Ставит кадр в очередь; при медленном диске кадр отбрасывается"""
+        size = len(jpeg)
+        with self._lock:
+            if self._pending_bytes + size > self.max_buffer_bytes:
+                self.frames_dropped += 1
+                return False
+            self._pending_bytes += size
+        self._queue.put((RECORD_FRAME, t_ns, bytes(jpeg)))
+        return True
+
+    def record_command(self, command, t_ns):
+        self._queue.put((RECORD_COMMAND, t_ns, command.encode("utf-8")))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "commands_written": self.commands_written,
+            "pending_bytes": self._pending_bytes
+        }
+
+    def _open_segment(self, k):
+        self._close_segment()
+        base = os.path.join(self.path, f"seg_{k:06d}")
+        # Крупный буфер: пишем редко и большими блоками
+        self._data = open(base + ".dat", "wb", buffering=1024 * 1024)
+        self._index = open(base + ".idx", "wb", buffering=64 * 1024)
+        self._data.write(MAGIC)
+        self._segment = k
+        self._offset = len(MAGIC)
+        self._last_bucket = -1
+
+    def _close_segment(self):
+        if self._data is not None:
+            self._data.close()
+            self._index.close()
+            self._data = None
+            self._index = None
+
+    def _write(self, kind, t_ns, payload):
+        k = max(0, (t_ns - self.start_ns) // self.segment_ns)
+        if self._segment is None or k > self._segment:
+            self._open_segment(k)
+
+        # Заполняем индекс до текущего шага смещением этой записи
+        segment_start = self.start_ns + self._segment * self.segment_ns
+        bucket = max(0, (t_ns - segment_start) // self.index_step_ns)
+        if bucket > self._last_bucket:
+            entry = INDEX_ENTRY.pack(self._offset)
+            self._index.write(entry * (bucket - self._last_bucket))
+            self._last_bucket = bucket
+
+        self._data.write(RECORD_HEADER.pack(kind, t_ns, len(payload)))
+        self._data.write(payload)
+        self._offset += RECORD_HEADER.size + len(payload)
+
+    def _writer(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+
+            if item is None:
+                break
+
+            if item:
+                kind, t_ns, payload = item
+                try:
+                    self._write(kind, t_ns, payload)
+                except OSError as e:
+                    print(f"❌ Ошибка записи самописца: {e}")
+                if kind == RECORD_FRAME:
+                    with self._lock:
+                        self._pending_bytes -= len(payload)
+                    self.frames_written += 1
+                else:
+                    self.commands_written += 1
+
+            if time.monotonic() >= next_flush and self._data is not None:
+                next_flush = time.monotonic() + self.flush_interval
+                self._data.flush()
+                self._index.flush()
+
+        self._close_segment()
+
+
+class RecordingReader:
+    """Чтение записи через mmap с поиском по времени"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "recording.json")) as f:
+            meta = json.load(f)
+        self.start_ns = meta["start_ns"]
+        self.segment_ns = meta["segment_ns"]
+        self.index_step_ns = meta["index_step_ns"]
+        self.segments = sorted(
+            int(name[4:10]) for name in os.listdir(path)
+            if name.startswith("seg_") and name.endswith(".dat")
+        )
+        self._maps = {}
+
+    def _map(self, filename):
+        if filename not in self._maps:
+            with open(os.path.join(self.path, filename), "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                # mmap пустого файла невозможен
+                self._maps[filename] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        return self._maps[filename]
+
+    def _seek(self, k, t_ns):
+        """Смещение первой записи сегмента k не раньше шага индекса для t_ns"""
+        segment_start = self.start_ns + k * self.segment_ns
+        bucket = (t_ns - segment_start) // self.index_step_ns
+        if bucket <= 0:
+            return len(MAGIC)
+        index = self._map(f"seg_{k:06d}.idx")
+        position = bucket * INDEX_ENTRY.size
+        if position + INDEX_ENTRY.size > len(index):
+            return None  # После последней записи сегмента
+        return INDEX_ENTRY.unpack_from(index, position)[0]
+
+    def records(self, from_ns=None):
+        """Генерирует (тип, t_ns, payload memoryview) начиная с from_ns"""
+        if from_ns is None:
+            from_ns = self.start_ns
+        first = (from_ns - self.start_ns) // self.segment_ns
+
+        for k in self.segments:
+            if k < first:
+                continue
+            offset = self._seek(k, from_ns) if k == first else len(MAGIC)
+            if offset is None:
+                continue
+
+            data = self._map(f"seg_{k:06d}.dat")
+            view = memoryview(data)
+            while offset + RECORD_HEADER.size <= len(data):
+                kind, t_ns, size = RECORD_HEADER.unpack_from(data, offset)
+                start = offset + RECORD_HEADER.size
+                if start + size > len(data):
+                    break  # Оборванная запись в конце (сбой питания)
+                offset = start + size
+                if t_ns >= from_ns:
+                    yield kind, t_ns, view[start:start + size]
+
+    def close(self):
+        for m in self._maps.values():
+            if isinstance(m, mmap.mmap):
+                try:
+                    m.close()
+                except BufferError:
+                    pass  # Остались живые срезы; mmap закроется сборщиком мусора
+        self._maps.clear()
+
+
+def replay(path, port=5555, from_s=0.0, speed=1.0):
+    """Отдаёт записанные кадры через обычный путь публикации CameraStreamer"""
+    from robot import CameraStreamer
+
+    reader = RecordingReader(path)
+    streamer = CameraStreamer(port=port)
+    from_ns = reader.start_ns + int(from_s * 1e9)
+
+    print(f"▶️  Воспроизведение {path} с {from_s:.1f} с, скорость x{speed}")
+    records = reader.records(from_ns)
+    t_wall0 = None
+    try:
+        for kind, t_ns, payload in records:
+            if t_wall0 is None:
+                t_wall0, t_rec0 = time.monotonic(), t_ns
+            delay = (t_ns - t_rec0) / 1e9 / speed - (time.monotonic() - t_wall0)
+            if delay > 0:
+                time.sleep(delay)
+
+            if kind == RECORD_FRAME:
+                streamer.publish(payload, t_ns)
+            elif kind == RECORD_COMMAND:
+                print(f"📨 {(t_ns - reader.start_ns) / 1e9:8.3f} с  {bytes(payload).decode('utf-8')}")
+    except KeyboardInterrupt:
+        print("\n⏹️  Воспроизведение остановлено")
+    finally:
+        print(f"Всего отправлено кадров: {streamer.frame_count}")
+        records.close()
+        reader.close()
+        streamer.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записи самописца")
+    parser.add_argument("path", help="каталог записи")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--from", dest="from_s", type=float, default=0.0,
+                        help="начать с секунды записи")
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+    replay(args.path, port=args.port, from_s=args.from_s, speed=args.speed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Ретранслятор видео: один раз подписывается на робота и раздаёт кадры
+без изменений любому числу зрителей, чтобы Wi-Fi робота нёс один поток.
+
+Два выхода:
+  * XPUB (по умолчанию 5560) - поток как у робота; подходит обычный nout.py
+  * ROUTER (по умолчанию 5561) - зрители с согласованной частотой кадров.
+    Зритель (DEALER) шлёт JSON {"fps": 5, "hwm": 2, "policy": "drop_oldest", "topic": "lo"}
+    и повторяет его не реже раза в SUBSCRIBER_TIMEOUT секунд (heartbeat).
+    policy: drop_oldest - отдаём самые свежие кадры, drop_newest - не трогаем очередь.
+
+У робота ретранслятор подписан (XSUB) только на топики, нужные зрителям обоих
+выходов: робот не кодирует и не шлёт по Wi-Fi варианты, которые никто не смотрит.
+"""
+
+import argparse
+import collections
+import json
+import time
+
+import zmq
+
+from protocol import topic_prefix
+
+SUBSCRIBER_TIMEOUT = 5.0
+POLICIES = ("drop_oldest", "drop_newest")
+
+
+class Subscriber:
+    def __init__(self, identity):
+        self.identity = identity
+        self.fps = None
+        self.hwm = 2
+        self.policy = "drop_oldest"
+        self.prefix = b""
+        self.queue = collections.deque()
+        self.next_due = 0.0
+        self.last_seen = time.monotonic()
+
+        self.sent = 0
+        self.skipped_rate = 0   # Пропущено, чтобы держать запрошенный fps
+        self.dropped_hwm = 0    # Выброшено из-за переполнения очереди
+        self.blocked = 0        # Попытки отправки при полном канале (зритель не успевает)
+        self._window_start = time.monotonic()
+        self._window_sent = 0
+        self.fps_actual = 0.0
+
+    def configure(self, request):
+        """Применяет запрос целиком или (при ValueError/TypeError) не меняет ничего"""
+        fps = request.get("fps")
+        fps = float(fps) if fps else None
+        hwm = max(1, int(request.get("hwm", self.hwm)))
+        policy = request.get("policy", self.policy)
+
+        self.fps = fps
+        self.hwm = hwm
+        if policy in POLICIES:
+            self.policy = policy
+        self.prefix = topic_prefix(request.get("topic") or "")
+        self.last_seen = time.monotonic()
+
+    def offer(self, message, now):
+        """Новый кадр от робота: прореживание по fps и политика очереди"""
+        if not message.startswith(self.prefix):
+            return
+        if self.fps:
+            if now < self.next_due:
+                self.skipped_rate += 1
+                return
+            # Без накопления долга, если кадры шли реже запрошенного
+            self.next_due = max(self.next_due + 1.0 / self.fps, now)
+
+        if len(self.queue) >= self.hwm:
+            self.dropped_hwm += 1
+            if self.policy == "drop_newest":
+                return
+            self.queue.popleft()
+        self.queue.append(message)
+
+    def flush(self, socket):
+        while self.queue:
+            try:
+                socket.send_multipart([self.identity, self.queue[0]], zmq.NOBLOCK)
+            except zmq.Again:
+                self.blocked += 1
+                return
+            self.queue.popleft()
+            self.sent += 1
+            self._window_sent += 1
+
+    def stats(self, now):
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            self.fps_actual = self._window_sent / elapsed
+            self._window_start = now
+            self._window_sent = 0
+        return {
+            "topic": self.prefix.decode().strip(),
+            "fps_requested": self.fps,
+            "fps_actual": round(self.fps_actual, 1),
+            "hwm": self.hwm,
+            "policy": self.policy,
+            "queued": len(self.queue),
+            "sent": self.sent,
+            "skipped_rate": self.skipped_rate,
+            "dropped_hwm": self.dropped_hwm,
+            "blocked": self.blocked,
+            "last_seen_s": round(now - self.last_seen, 1)
+        }
+
+
+class VideoRelay:
+    def __init__(self, robot_host, robot_port=5555, pub_port=5560, router_port=5561,
+                 stats_interval=5.0):
+        self.context = zmq.Context()
+
+        # XSUB: подписки у робота выставляем сами, по запросам зрителей
+        self.upstream = self.context.socket(zmq.XSUB)
+        self.upstream.setsockopt(zmq.RCVHWM, 10)
+        self.upstream.connect(f"tcp://{robot_host}:{robot_port}")
+        # Сколько зрителей (XPUB топик считается за одного) держат префикс
+        self.upstream_refs = collections.Counter()
+
+        # XPUB: подписки зрителей nout.py приходят как b'\x01топик' / b'\x00топик'
+        self.pub = self.context.socket(zmq.XPUB)
+        self.pub.setsockopt(zmq.SNDHWM, 10)
+        self.pub.bind(f"tcp://0.0.0.0:{pub_port}")
+
+        self.router = self.context.socket(zmq.ROUTER)
+        # Без MANDATORY ROUTER молча теряет кадры; с ним видно, кто не успевает
+        self.router.setsockopt(zmq.ROUTER_MANDATORY, 1)
+        self.router.setsockopt(zmq.SNDHWM, 4)
+        self.router.bind(f"tcp://0.0.0.0:{router_port}")
+
+        self.subscribers = {}
+        self.stats_interval = stats_interval
+        self.frames_in = 0
+
+        print(f"📡 Робот:      tcp://{robot_host}:{robot_port}")
+        print(f"📺 XPUB:       tcp://[IP_РЕТРАНСЛЯТОРА]:{pub_port}")
+        print(f"🎚️  ROUTER:     tcp://[IP_РЕТРАНСЛЯТОРА]:{router_port}")
+
+    def _subscribe(self, prefix):
+        self.upstream_refs[prefix] += 1
+        if self.upstream_refs[prefix] == 1:
+            self.upstream.send(b"\x01" + prefix)
+            print(f"🔔 Подписка у робота: '{prefix.decode().strip() or '*'}'")
+
+    def _unsubscribe(self, prefix):
+        self.upstream_refs[prefix] -= 1
+        if self.upstream_refs[prefix] <= 0:
+            del self.upstream_refs[prefix]
+            self.upstream.send(b"\x00" + prefix)
+            print(f"🔕 Отписка у робота: '{prefix.decode().strip() or '*'}'")
+
+    def _handle_pub_subscription(self):
+        event = self.pub.recv()
+        if not event:
+            return
+        if event[0] == 1:
+            self._subscribe(event[1:])
+        elif event[0] == 0 and event[1:] in self.upstream_refs:
+            self._unsubscribe(event[1:])
+
+    def _remove(self, identity):
+        sub = self.subscribers.pop(identity, None)
+        if sub is not None:
+            self._unsubscribe(sub.prefix)
+
+    def _handle_request(self):
+        frames = self.router.recv_multipart()
+        identity = frames[0]
+        # Порт открыт для всех: кривой запрос отбрасывается, ретранслятор работает дальше
+        try:
+            if len(frames) != 2:
+                raise ValueError(f"ожидается 1 кадр, получено {len(frames) - 1}")
+            request = json.loads(frames[1])
+            if not isinstance(request, dict):
+                raise ValueError("ожидается JSON объект")
+            topic = request.get("topic")
+            if topic is not None and not isinstance(topic, str):
+                raise ValueError("topic: ожидается строка")
+        except ValueError as e:
+            print(f"❌ Некорректный запрос от {identity.hex()}: {e}")
+            return
+
+        sub = self.subscribers.get(identity)
+        if sub is None:
+            sub = Subscriber(identity)
+        old_prefix = sub.prefix
+        try:
+            sub.configure(request)
+        except (ValueError, TypeError) as e:
+            print(f"❌ Некорректный запрос от {identity.hex()}: {e}")
+            return
+        if identity not in self.subscribers:
+            self.subscribers[identity] = sub
+            self._subscribe(sub.prefix)
+            print(f"➕ Новый зритель {identity.hex()}")
+        elif sub.prefix != old_prefix:
+            # Сначала новая подписка: общий префикс не должен мигать у робота
+            self._subscribe(sub.prefix)
+            self._unsubscribe(old_prefix)
+
+    def _handle_frame(self):
+        message = self.upstream.recv()
+        now = time.monotonic()
+        self.frames_in += 1
+
+        # Кадр уходит дальше без изменений
+        try:
+            self.pub.send(message, zmq.NOBLOCK)
+        except zmq.Again:
+            pass
+        for sub in self.subscribers.values():
+            sub.offer(message, now)
+
+    def _expire(self, now):
+        for identity, sub in list(self.subscribers.items()):
+            if now - sub.last_seen > SUBSCRIBER_TIMEOUT:
+                self._remove(identity)
+                print(f"➖ Зритель {identity.hex()} отключился")
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "frames_in": self.frames_in,
+            "upstream_topics": sorted(p.decode().strip() or "*" for p in self.upstream_refs),
+            "subscribers": {
+                identity.hex(): sub.stats(now) for identity, sub in self.subscribers.items()
+            }
+        }
+
+    def run(self):
+        poller = zmq.Poller()
+        poller.register(self.upstream, zmq.POLLIN)
+        poller.register(self.router, zmq.POLLIN)
+        poller.register(self.pub, zmq.POLLIN)
+        next_stats = time.monotonic() + self.stats_interval
+
+        try:
+            while True:
+                pending = any(sub.queue for sub in self.subscribers.values())
+                # Пока есть неотправленное, опрашиваем чаще
+                events = dict(poller.poll(5 if pending else 100))
+
+                if self.pub in events:
+                    self._handle_pub_subscription()
+                if self.router in events:
+                    self._handle_request()
+                if self.upstream in events:
+                    self._handle_frame()
+
+                for sub in list(self.subscribers.values()):
+                    try:
+                        sub.flush(self.router)
+                    except zmq.ZMQError:
+                        # EHOSTUNREACH: зритель ушёл, не дождавшись таймаута
+                        self._remove(sub.identity)
+
+                now = time.monotonic()
+                if now >= next_stats:
+                    next_stats = now + self.stats_interval
+                    self._expire(now)
+                    print(json.dumps(self.stats(), ensure_ascii=False))
+        except KeyboardInterrupt:
+            print("\n🛑 Остановка ретранслятора")
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        for socket in (self.upstream, self.pub, self.router):
+            socket.close(linger=0)
+        self.context.term()
+        print(f"Всего принято кадров: {self.frames_in}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ретранслятор видео робота")
+    parser.add_argument("robot_host", help="IP робота")
+    parser.add_argument("--robot-port", type=int, default=5555)
+    parser.add_argument("--pub-port", type=int, default=5560)
+    parser.add_argument("--router-port", type=int, default=5561)
+    args = parser.parse_args()
+    VideoRelay(args.robot_host, args.robot_port, args.pub_port, args.router_port).run()
+
+
+if __name__ == "__main__":
+    main()
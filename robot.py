@@ -1,95 +1,379 @@
-import cv2
 import zmq
-import base64
-import numpy as np
+import json
+import math
+import threading
 import time
 import socket
 
+from protocol import pack_frame, topic_prefix
+from startup import probe_camera, apply_camera_format, read_camera_format
+
+# cv2 импортируется лениво в start_stream: сам импорт занимает заметное
+# время на Raspberry Pi, а демону нужно быстрее поднять сервер команд
+
+# Варианты потока из одного кадра камеры. Каждый уходит со своим топиком,
+# приёмник подписывается на нужный (VideoReceiver(topic="hi"))
+DEFAULT_RENDITIONS = [
+    {"topic": "lo", "width": 320, "height": 240, "quality": 70, "fps": 15},
+    {"topic": "hi", "width": 640, "height": 480, "quality": 85, "fps": 5},
+]
+
+ROI_TOPIC = "roi"
+# Частота обзорных вариантов, пока кто-то смотрит область интереса
+ROI_OVERVIEW_FPS = 2
+# Область интереса живёт, пока приёмник повторяет запрос (ушедший не держит её)
+ROI_LEASE_S = 5.0
+# Наименьший размер кадра области; наибольший - режим камеры
+ROI_MIN_SIZE = 16
+
 class CameraStreamer:
-    def __init__(self, port=5555, camera_index=0):
+    def __init__(self, port=5555, camera_index=0, context=None, timer=None, recorder=None,
+                 renditions=None, control_port=5558, vision=None, capture=None):
         self.port = port
         self.camera_index = camera_index
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.PUB)
-        
+        self.timer = timer  # startup.StartupTimer для отчёта о времени запуска
+        self.recorder = recorder  # recorder.FlightRecorder, если нужна запись
+        self.vision = vision  # vision.SafetyVision, бортовая проверка препятствий
+        self.renditions = self._prepare_renditions(renditions or DEFAULT_RENDITIONS)
+        # Режим камеры; по умолчанию размер самого крупного варианта
+        if capture is None:
+            largest = max(self.renditions, key=lambda r: r["width"] * r["height"])
+            capture = {"width": largest["width"], "height": largest["height"],
+                       "fps": max(r["fps"] for r in self.renditions)}
+        self.capture = dict(capture)
+        self.camera_format = None  # Фактический формат открытой камеры
+        # Новые настройки от другого потока; забираются камерой перед кадром
+        self._pending = None
+        self._pending_lock = threading.Lock()
+        # Общий контекст передаётся демоном, иначе создаём свой
+        self._own_context = context is None
+        self.context = context if context is not None else zmq.Context()
+        # XPUB вместо PUB: видим подписки и не кодируем то, что никто не смотрит
+        self.socket = self.context.socket(zmq.XPUB)
+        self.subscriptions = set()
+
         # Получаем IP адрес для диагностики
         hostname = socket.gethostname()
         local_ip = socket.gethostbyname(hostname)
         print(f"IP адрес робота: {local_ip}")
         print(f"Порт: {self.port}")
-        
+
         # Привязываемся ко всем интерфейсам
         self.socket.bind(f"tcp://0.0.0.0:{self.port}")
+
+        # Управление потоком от приёмников (область интереса)
+        self.control = self.context.socket(zmq.PULL)
+        self.control.setsockopt(zmq.LINGER, 0)
+        self.control.bind(f"tcp://0.0.0.0:{control_port}")
+        self.roi = None
         self.cap = None
         self.frame_count = 0
-        
-    def start_stream(self):
-        """Запускает потоковую передачу с камеры"""
-        self.cap = cv2.VideoCapture(self.camera_index)
-        
-        # Пробуем разные индексы камер если 0 не работает
-        if not self.cap.isOpened():
-            print("Пробуем другие индексы камеры...")
-            for i in range(1, 4):
-                self.cap = cv2.VideoCapture(i)
-                if self.cap.isOpened():
-                    print(f"Камера найдена на индексе {i}")
-                    break
-            else:
-                print("Ошибка: Не удалось открыть камеру")
+        self.capture_count = 0
+        self.last_frame_ns = 0  # time.monotonic_ns() последнего отправленного кадра
+
+    @staticmethod
+    def _prepare_renditions(renditions):
+        prepared = [dict(r) for r in renditions]
+        for r in prepared:
+            r["next_due"] = 0.0
+        return prepared
+
+    def reconfigure(self, renditions=None, capture=None, camera_index=None):
+        """
+        Потокобезопасно: настройки подхватываются перед следующим кадром.
+        Варианты потока меняются сразу, режим камеры - без переоткрытия,
+        если камера его принимает. Несколько вызовов до кадра сливаются
+        """
+        with self._pending_lock:
+            pending = self._pending or (None, None, None)
+            self._pending = tuple(new if new is not None else old for new, old in
+                                  zip((renditions, capture, camera_index), pending))
+
+    def _open_camera(self, index_changed=False):
+        """
+        Сначала индекс из кэша (или заданный, если его сменили),
+        остальные индексы пробуются параллельно
+        """
+        index, self.cap = probe_camera(preferred=self.camera_index, fmt=self.capture,
+                                       prefer_cached=not index_changed)
+        if self.cap is not None:
+            # Фактический индекс: заданная камера могла не открыться
+            self.camera_index = index
+            self.camera_format = read_camera_format(self.cap)
+        return index
+
+    def _apply_pending(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, None
+        renditions, capture, camera_index = pending
+
+        if renditions is not None:
+            self.renditions = self._prepare_renditions(renditions)
+            print(f"🎛️  Варианты потока: {[r['topic'] for r in self.renditions]}")
+
+        reopen = camera_index is not None and camera_index != self.camera_index
+        if capture is not None:
+            self.capture = dict(capture)
+            if not reopen:
+                # Устройство остаётся открытым, меняется только режим
+                apply_camera_format(self.cap, self.capture)
+                self.camera_format = read_camera_format(self.cap)
+                actual = (self.camera_format["width"], self.camera_format["height"])
+                reopen = actual != (self.capture["width"], self.capture["height"])
+                if reopen:
+                    print(f"⚠️  Камера не приняла режим на лету ({actual[0]}x{actual[1]}), переоткрываем")
+
+        if reopen:
+            index_changed = camera_index is not None and camera_index != self.camera_index
+            if camera_index is not None:
+                self.camera_index = camera_index
+            self.cap.release()
+            index = self._open_camera(index_changed)
+            if self.cap is None:
+                raise RuntimeError("не удалось переоткрыть камеру")
+            print(f"📷 Камера переоткрыта (индекс {index})")
+        if capture is not None:
+            print(f"📷 Режим камеры: {self.camera_format}")
+
+    def _poll_subscriptions(self):
+        """Читает подписки XPUB: b'\\x01топик' - подписка, b'\\x00топик' - отписка"""
+        while True:
+            try:
+                event = self.socket.recv(zmq.NOBLOCK)
+            except zmq.Again:
                 return
-        
-        # Настройки камеры
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        self.cap.set(cv2.CAP_PROP_FPS, 15)
-        
-        print("Камера инициализирована успешно")
+            if not event:
+                continue
+            if event[0] == 1:
+                self.subscriptions.add(event[1:])
+            elif event[0] == 0:
+                self.subscriptions.discard(event[1:])
+
+    def _poll_control(self):
+        """Запросы приёмников; применяются к следующему же кадру"""
+        while True:
+            try:
+                request = json.loads(self.control.recv(zmq.NOBLOCK))
+            except zmq.Again:
+                return
+            except ValueError as e:
+                print(f"❌ Некорректный запрос управления: {e}")
+                continue
+            # Порт без авторизации: кривой запрос не должен ронять видео
+            if not isinstance(request, dict):
+                print(f"❌ Некорректный запрос управления: {request!r}")
+                continue
+            if "roi" in request:
+                self.set_roi(request["roi"])
+
+    def set_roi(self, roi):
+        """
+        roi: {"rect": [x, y, w, h] в долях кадра 0..1, "width", "height",
+        "quality", "fps"} или None, чтобы отключить.
+        Действует ROI_LEASE_S секунд; повтор запроса продлевает срок.
+        Размер ограничивается ROI_MIN_SIZE..режим камеры, качество 1..100
+        """
+        if not roi:
+            self.roi = None
+            print("🔍 Область интереса отключена")
+            return
+        try:
+            rect = [float(v) for v in roi["rect"]]
+            if len(rect) != 4 or not all(math.isfinite(v) for v in rect):
+                raise ValueError("rect: ожидается 4 конечных числа")
+            x, y, w, h = (min(max(v, 0.0), 1.0) for v in rect)
+            w = min(w, 1.0 - x)
+            h = min(h, 1.0 - y)
+            if w <= 0 or h <= 0:
+                raise ValueError("пустая область")
+            # Порт управления без авторизации: размер не должен ни ронять
+            # cv2.resize (0, < 0), ни выделять гигабайты на каждый кадр
+            max_width, max_height = self.capture["width"], self.capture["height"]
+            new_roi = {
+                "rect": (x, y, w, h),
+                "width": min(max(int(roi.get("width", 320)), ROI_MIN_SIZE), max_width),
+                "height": min(max(int(roi.get("height", 240)), ROI_MIN_SIZE), max_height),
+                "quality": min(max(int(roi.get("quality", 85)), 1), 100),
+                "fps": float(roi.get("fps", 15)),
+                "expires": time.monotonic() + ROI_LEASE_S
+            }
+            if not new_roi["fps"] > 0:
+                raise ValueError("fps должен быть больше 0")
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            print(f"❌ Некорректная область интереса {roi}: {e}")
+            return
+        previous = self.roi
+        renewal = previous is not None and all(
+            previous[k] == new_roi[k] for k in ("rect", "width", "height", "quality", "fps"))
+        # Продление не сбивает расписание кадров области
+        new_roi["next_due"] = previous["next_due"] if renewal else 0.0
+        self.roi = new_roi
+        if renewal:
+            return
+        print(f"🔍 Область интереса: {new_roi['rect']} -> "
+              f"{new_roi['width']}x{new_roi['height']}")
+
+    def _roi_active(self):
+        """Область задана, срок не истёк и на неё подписаны явно"""
+        roi = self.roi
+        if roi is None:
+            return False
+        if time.monotonic() > roi["expires"]:
+            self.roi = None
+            print("🔍 Область интереса отключена: запрос не продлён")
+            return False
+        # Подписка на всё (b'' у ретранслятора или записи) ROI не включает
+        return topic_prefix(ROI_TOPIC) in self.subscriptions
+
+    def _encode_roi(self, cv2, frame, t_capture_ns, now):
+        """Вырезает область из полного кадра и кодирует только её"""
+        roi = self.roi
+        if now < roi["next_due"]:
+            return
+        roi["next_due"] = max(roi["next_due"] + 1.0 / roi["fps"], now)
+
+        height, width = frame.shape[:2]
+        x, y, w, h = roi["rect"]
+        x0, y0 = int(x * width), int(y * height)
+        x1, y1 = max(x0 + 1, int((x + w) * width)), max(y0 + 1, int((y + h) * height))
+        try:
+            crop = cv2.resize(frame[y0:y1, x0:x1], (roi["width"], roi["height"]))
+            ret, buffer = cv2.imencode('.jpg', crop, [
+                cv2.IMWRITE_JPEG_QUALITY, roi["quality"]
+            ])
+        except cv2.error as e:
+            # Ошибка области не должна останавливать основной поток
+            print(f"❌ Ошибка кодирования области интереса: {e}")
+            self.roi = None
+            return
+        if ret:
+            self.publish(buffer, t_capture_ns, ROI_TOPIC, self.capture_count)
+
+    def is_watched(self, topic):
+        """Есть ли подписчик, чей префикс совпадает с сообщениями топика"""
+        prefix = topic_prefix(topic)
+        return any(prefix.startswith(s) for s in self.subscriptions)
+
+    def publish(self, jpeg, t_capture_ns=None, topic=None, frame_id=None):
+        """Отправляет закодированный JPEG подписчикам"""
+        if t_capture_ns is None:
+            t_capture_ns = time.monotonic_ns()
+        if topic is None:
+            topic = self.renditions[0]["topic"]
+        if frame_id is None:
+            frame_id = self.frame_count
+        message = pack_frame(jpeg, frame_id, t_capture_ns, topic)
+
+        try:
+            self.socket.send(message)
+            self.frame_count += 1
+            self.last_frame_ns = time.monotonic_ns()
+            if self.timer and self.timer.mark_once("first_frame"):
+                print(self.timer.report())
+            if self.frame_count % 30 == 0:  # Каждые 30 кадров
+                print(f"Отправлено кадров: {self.frame_count}")
+        except zmq.ZMQError as e:
+            print(f"Ошибка отправки: {e}")
+
+    def _due_renditions(self, now):
+        """Варианты, которые пора отправить и которые кому-то нужны"""
+        due = []
+        roi_active = self._roi_active()
+        for i, r in enumerate(self.renditions):
+            if now < r["next_due"]:
+                continue
+            # Первый вариант пишет самописец, поэтому он нужен и без подписчиков
+            needed = self.is_watched(r["topic"]) or (i == 0 and self.recorder)
+            if not needed:
+                continue
+            # Пока смотрят область интереса, обзор идёт редко
+            fps = min(r["fps"], ROI_OVERVIEW_FPS) if roi_active else r["fps"]
+            r["next_due"] = max(r["next_due"] + 1.0 / fps, now)
+            due.append(r)
+        return due
+
+    def _encode_renditions(self, cv2, frame, due, t_capture_ns):
+        """Общая пирамида: каждый вариант уменьшается из предыдущего, более крупного"""
+        image = frame
+        for r in sorted(due, key=lambda r: r["width"] * r["height"], reverse=True):
+            size = (r["width"], r["height"])
+            if (image.shape[1], image.shape[0]) != size:
+                image = cv2.resize(image, size)
+
+            # Кодирование в JPEG
+            ret, buffer = cv2.imencode('.jpg', image, [
+                cv2.IMWRITE_JPEG_QUALITY, r["quality"]
+            ])
+            if not ret:
+                continue
+
+            if self.is_watched(r["topic"]):
+                self.publish(buffer, t_capture_ns, r["topic"], self.capture_count)
+            if self.recorder and r is self.renditions[0]:
+                # Не блокирует: при медленном диске кадр отбрасывается
+                self.recorder.record_frame(buffer, t_capture_ns)
+
+    def start_stream(self, stop_event=None):
+        """Запускает потоковую передачу с камеры (до stop_event, если он задан)"""
+        import cv2
+        if self.timer:
+            self.timer.mark_once("import_cv2")
+
+        index = self._open_camera()
+        if self.cap is None:
+            print("Ошибка: Не удалось открыть камеру")
+            self.cleanup()
+            return
+
+        if self.timer:
+            self.timer.mark_once("camera_open")
+        print(f"Камера инициализирована успешно (индекс {index})")
         print("Ожидание подключения клиента...")
-        
+
         try:
-            while True:
+            while stop_event is None or not stop_event.is_set():
+                if self._pending is not None:
+                    self._apply_pending()
+
                 ret, frame = self.cap.read()
+                t_capture_ns = time.monotonic_ns()
                 if not ret:
                     print("Ошибка чтения кадра")
                     time.sleep(0.1)
                     continue
-                
-                # Ресайз для производительности
-                frame = cv2.resize(frame, (320, 240))
-                
-                # Кодирование в JPEG
-                ret, buffer = cv2.imencode('.jpg', frame, [
-                    cv2.IMWRITE_JPEG_QUALITY, 70
-                ])
-                
-                if ret:
-                    jpg_as_text = base64.b64encode(buffer)
-                    
-                    try:
-                        self.socket.send(jpg_as_text)
-                        self.frame_count += 1
-                        if self.frame_count % 30 == 0:  # Каждые 30 кадров
-                            print(f"Отправлено кадров: {self.frame_count}")
-                    except zmq.ZMQError as e:
-                        print(f"Ошибка отправки: {e}")
-                
-                time.sleep(0.033)  # ~15 FPS
-                
+                self.capture_count += 1
+
+                # Проверка безопасности до кодирования: стоп не ждёт сеть
+                if self.vision:
+                    self.vision.process(cv2, frame, t_capture_ns)
+
+                self._poll_subscriptions()
+                self._poll_control()
+                now = time.monotonic()
+                if self._roi_active():
+                    self._encode_roi(cv2, frame, t_capture_ns, now)
+                due = self._due_renditions(now)
+                if due:
+                    self._encode_renditions(cv2, frame, due, t_capture_ns)
+
+                time.sleep(1.0 / self.capture["fps"] / 2)
+
         except KeyboardInterrupt:
             print(f"\nВсего отправлено кадров: {self.frame_count}")
         except Exception as e:
             print(f"Ошибка: {e}")
         finally:
             self.cleanup()
-    
+
     def cleanup(self):
         if self.cap:
             self.cap.release()
         self.socket.close()
-        self.context.term()
+        self.control.close()
+        if self._own_context:
+            self.context.term()
         print("Ресурсы освобождены")
 
 if __name__ == "__main__":
     streamer = CameraStreamer(port=5555, camera_index=0)
-    streamer.start_stream()
\ No newline at end of file
+    streamer.start_stream()
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Единый демон робота: видеопоток, сервер команд и телеметрия в одном процессе.
+Подсистемы работают в отдельных потоках с общим zmq.Context и общей
+монотонной шкалой времени (time.monotonic_ns), поэтому задержку команд
+можно сопоставлять с кадрами. Упавшая подсистема перезапускается сама,
+не затрагивая остальные.
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+import zmq
+
+from command_server import CommandServer
+from config import load_config, save_config, updated, diff_sections
+from motors import BACKENDS, MOCK_BACKEND, create_controller, create_controller_auto
+from robot import CameraStreamer
+from startup import StartupTimer, process_start_ns
+
+# Какую подсистему перезапускать при смене порта
+PORT_SUBSYSTEMS = {
+    "video": "camera",
+    "video_control": "camera",
+    "commands": "commands",
+    "telemetry": "telemetry"
+}
+
+
+class Subsystem:
+    """Поток подсистемы с автоматическим перезапуском при сбое"""
+
+    def __init__(self, name, run, restart_delay=1.0):
+        # run(stop_event) работает до stop_event; любой выход раньше — сбой
+        self.name = name
+        self.run = run
+        self.restart_delay = restart_delay
+        self.restarts = 0
+        self.last_error = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._supervise, name=self.name, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=3.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def restart(self):
+        """Ручной перезапуск только этой подсистемы"""
+        self.stop()
+        self.start()
+
+    def _supervise(self):
+        stop_event = self._stop_event
+        while not stop_event.is_set():
+            try:
+                self.run(stop_event)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Подсистема {self.name} упала: {e}")
+
+            if stop_event.is_set():
+                break
+
+            self.restarts += 1
+            print(f"🔁 Перезапуск {self.name} через {self.restart_delay} с "
+                  f"(перезапусков: {self.restarts})")
+            stop_event.wait(self.restart_delay)
+
+    def status(self):
+        return {
+            "alive": self.alive,
+            "restarts": self.restarts,
+            "last_error": self.last_error
+        }
+
+
+class RobotDaemon:
+    def __init__(self, config=None, config_path=None, telemetry_interval=1.0, timer=None,
+                 record_dir=None, safety=False):
+        # Действующий конфиг заменяется целиком (атомарно) при каждом изменении
+        self.config = config if config is not None else load_config(config_path)
+        self.config_path = config_path
+        self._config_lock = threading.Lock()
+        # Действия для главного потока (перезапуск подсистем после ответа клиенту)
+        self._actions = queue.Queue()
+        self.backend = self.config["motors"]["backend"]
+        self.telemetry_interval = telemetry_interval
+        self.timer = timer if timer is not None else StartupTimer()
+
+        self.context = zmq.Context()
+        # Общая точка отсчёта для всех подсистем
+        self.start_ns = time.monotonic_ns()
+        # События от подсистем для телеметрии (PUB сокет не потокобезопасен)
+        self.events = queue.Queue(maxsize=1000)
+
+        self.controller = None
+        # Все вызовы контроллера: команды, аварийный стоп, замена, остановка
+        self.controller_lock = threading.Lock()
+        self.streamer = None
+        self.server = None
+        self.recorder = None
+        if record_dir:
+            from recorder import FlightRecorder
+            # Каждый запуск пишется в свой каталог
+            session = os.path.join(record_dir, time.strftime("%Y%m%d_%H%M%S"))
+            self.recorder = FlightRecorder(session)
+            print(f"⏺️  Запись в {session}")
+
+        self.last_command = "stop"
+        self.vision = None
+        if safety:
+            from vision import SafetyVision
+            self.vision = SafetyVision(on_trigger=self._on_safety_trigger)
+
+        self.subsystems = {
+            "camera": Subsystem("camera", self._run_camera),
+            "commands": Subsystem("commands", self._run_commands),
+            "telemetry": Subsystem("telemetry", self._run_telemetry),
+        }
+
+    def _publish_event(self, event):
+        event.setdefault("t_ns", time.monotonic_ns())
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            pass  # Телеметрия не должна тормозить управление
+
+    def _current_frame(self):
+        if self.streamer is None:
+            return None, 0
+        return self.streamer.capture_count, self.streamer.last_frame_ns
+
+    def _on_safety_trigger(self, reason, features, t_ns):
+        """Вызывается из потока камеры: останавливаем моторы без сетевого перехода"""
+        # Решение и остановка под одним замком с командами: last_command
+        # соответствует тому, что реально записано в пины
+        with self.controller_lock:
+            moving = self.last_command in ("forward", "backward", "left", "right")
+            # Препятствие опасно только при движении вперёд; отъехать назад можно
+            if not moving or (reason == "obstacle" and self.last_command != "forward"):
+                return
+            if self.controller is not None:
+                self.controller.stop()
+            self.last_command = "stop"
+        t_stop_ns = time.monotonic_ns()
+        print(f"🛑 Аварийная остановка: {reason} "
+              f"({(t_stop_ns - t_ns) / 1e6:.1f} мс от захвата кадра)")
+        self._publish_event({
+            "type": "safety_stop",
+            "reason": reason,
+            "features": features,
+            "t_ns": t_stop_ns,
+            "frame_ns": t_ns
+        })
+
+    def _on_command(self, message, t_recv_ns, t_done_ns):
+        if message in ("forward", "backward", "left", "right", "stop"):
+            self.last_command = message
+        if self.timer.mark_once("first_command"):
+            print(self.timer.report())
+        if self.recorder:
+            self.recorder.record_command(message, t_recv_ns)
+        frame, frame_ns = self._current_frame()
+        self._publish_event({
+            "type": "command",
+            "command": message,
+            "t_ns": t_recv_ns,
+            "t_done_ns": t_done_ns,
+            "frame": frame,
+            "frame_ns": frame_ns
+        })
+
+    @staticmethod
+    def _capture(config):
+        """Режим камеры из конфига (без индекса и пустых полей)"""
+        return {key: value for key, value in config["camera"].items()
+                if key != "index" and value is not None}
+
+    @staticmethod
+    def _limits(config):
+        return {key: config["motors"][key] for key in ("min_speed", "max_speed")}
+
+    def _create_controller(self, motors):
+        if motors["backend"] == "auto":
+            backend, controller = create_controller_auto(motors["pins"])
+        else:
+            backend, controller = motors["backend"], create_controller(motors["backend"], motors["pins"])
+        controller.current_speed = motors["speed"]
+        return backend, controller
+
+    def _run_camera(self, stop_event):
+        config = self.config
+        self.streamer = CameraStreamer(
+            port=config["ports"]["video"],
+            camera_index=config["camera"]["index"],
+            context=self.context,
+            timer=self.timer,
+            recorder=self.recorder,
+            renditions=config["renditions"],
+            control_port=config["ports"]["video_control"],
+            vision=self.vision,
+            capture=self._capture(config)
+        )
+        self.streamer.start_stream(stop_event)
+
+    def _run_commands(self, stop_event):
+        config = self.config
+        # Контроллер создаётся один раз: повторная инициализация GPIO дорогая
+        with self.controller_lock:
+            if self.controller is None:
+                self.backend, self.controller = self._create_controller(config["motors"])
+        self.timer.mark_once(f"gpio_{self.backend}")
+        self.server = CommandServer(
+            self.controller,
+            port=config["ports"]["commands"],
+            context=self.context,
+            on_command=self._on_command,
+            config_handler=self._handle_config,
+            limits=self._limits(config),
+            lock=self.controller_lock
+        )
+        self.timer.mark_once("commands_ready")
+        self.server.serve(stop_event)
+
+    def _config_response(self, **extra):
+        response = {
+            "status": "success",
+            "command": "config",
+            "config": self.config,
+            "camera_actual": ({"index": self.streamer.camera_index, **self.streamer.camera_format}
+                              if self.streamer and self.streamer.camera_format else None)
+        }
+        response.update(extra)
+        return response
+
+    def _handle_config(self, updates):
+        """
+        Команда config из потока команд. Обновление проверяется целиком и
+        применяется атомарно: при любой ошибке действующий конфиг не меняется
+        """
+        if updates is None:
+            return self._config_response()
+
+        with self._config_lock:
+            old = self.config
+            try:
+                new = updated(old, updates)
+            except ValueError as e:
+                return self._config_response(status="error", error=str(e))
+            changed = diff_sections(old, new)
+
+            # Смена пинов/бэкенда - единственное, что может не получиться
+            # синхронно, поэтому она идёт первой, до замены конфига
+            if changed & {"motors.pins", "motors.backend"} and self.controller is not None:
+                # Под замком: ни команда, ни аварийный стоп не попадут в освобождённый контроллер
+                with self.controller_lock:
+                    self.controller.cleanup()
+                    # Освобождённый контроллер стоит, новый тоже создаётся стоящим
+                    self.last_command = "stop"
+                    try:
+                        self.backend, self.controller = self._create_controller(new["motors"])
+                    except Exception as e:
+                        error = f"моторы: {e}"
+                        try:
+                            self.backend, self.controller = self._create_controller(old["motors"])
+                        except Exception as rollback_error:
+                            # Старый контроллер уже освобождён: моторы остановлены, команды
+                            # движения получают ошибку, перезапуск подсистемы пробует снова
+                            self.backend, self.controller = None, None
+                            self._actions.put(self.subsystems["commands"].restart)
+                            error += f"; откат не удался: {rollback_error}"
+                            print(f"❌ Моторы недоступны: {rollback_error}")
+                        if self.server:
+                            self.server.controller = self.controller
+                        return self._config_response(status="error", error=error)
+                    if self.server:
+                        self.server.controller = self.controller
+
+            self.config = new
+
+        # Поток и камера - перед следующим кадром
+        if self.streamer and changed & {"renditions", "camera"}:
+            self.streamer.reconfigure(
+                renditions=new["renditions"] if "renditions" in changed else None,
+                capture=self._capture(new) if "camera" in changed else None,
+                camera_index=new["camera"]["index"] if "camera" in changed else None
+            )
+
+        # Моторы - на следующей команде
+        if self.server and changed & {"motors.min_speed", "motors.max_speed"}:
+            self.server.set_limits(self._limits(new))
+        if "motors.speed" in changed:
+            with self.controller_lock:
+                if self.controller is not None:
+                    self.controller.current_speed = new["motors"]["speed"]
+
+        # Порты: перезапуск только затронутых подсистем, после ответа клиенту
+        restarting = sorted({
+            PORT_SUBSYSTEMS[name] for name in new["ports"]
+            if new["ports"][name] != old["ports"][name]
+        })
+        for name in restarting:
+            self._actions.put(self.subsystems[name].restart)
+
+        if self.config_path:
+            try:
+                save_config(new, self.config_path)
+            except OSError as e:
+                print(f"⚠️  Конфиг применён, но не сохранён: {e}")
+
+        print(f"🎛️  Конфиг изменён: {sorted(changed)}")
+        self._publish_event({"type": "config", "changed": sorted(changed)})
+        return self._config_response(changed=sorted(changed), restarting=restarting)
+
+    def _run_telemetry(self, stop_event):
+        socket = self.context.socket(zmq.PUB)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.bind(f"tcp://*:{self.config['ports']['telemetry']}")
+        next_status = time.monotonic()
+
+        try:
+            while not stop_event.is_set():
+                try:
+                    event = self.events.get(timeout=0.1)
+                    socket.send_string(json.dumps(event))
+                except queue.Empty:
+                    pass
+
+                if time.monotonic() >= next_status:
+                    next_status += self.telemetry_interval
+                    socket.send_string(json.dumps(self.status()))
+        finally:
+            socket.close()
+
+    def status(self):
+        frame, frame_ns = self._current_frame()
+        return {
+            "type": "status",
+            "t_ns": time.monotonic_ns(),
+            "uptime_s": (time.monotonic_ns() - self.start_ns) / 1e9,
+            "frame": frame,
+            "frame_ns": frame_ns,
+            "commands": self.server.command_count if self.server else 0,
+            "backend": self.backend,
+            "recorder": self.recorder.stats() if self.recorder else None,
+            "safety": self.vision.stats() if self.vision else None,
+            "subsystems": {
+                name: sub.status() for name, sub in self.subsystems.items()
+            }
+        }
+
+    def start(self):
+        ports = self.config["ports"]
+        print("=" * 50)
+        print("🤖 ДЕМОН РОБОТА")
+        print(f"📹 Видео:      tcp://[IP_РОБОТА]:{ports['video']}")
+        print(f"🎮 Команды:    tcp://[IP_РОБОТА]:{ports['commands']}")
+        print(f"📊 Телеметрия: tcp://[IP_РОБОТА]:{ports['telemetry']}")
+        print(f"🔍 Управление видео: tcp://[IP_РОБОТА]:{ports['video_control']}")
+        print("=" * 50)
+        self.timer.mark_once("daemon_start")
+        for sub in self.subsystems.values():
+            sub.start()
+
+    def stop(self):
+        for sub in self.subsystems.values():
+            sub.stop()
+        with self.controller_lock:
+            if self.controller is not None:
+                self.controller.cleanup()
+        if self.recorder is not None:
+            self.recorder.close()
+        self.context.term()
+        print("🔴 Демон остановлен")
+
+    def run_forever(self):
+        self.start()
+        try:
+            while True:
+                try:
+                    action = self._actions.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                action()
+        except KeyboardInterrupt:
+            print("\n🛑 Остановка демона...")
+        finally:
+            self.stop()
+
+
+def main():
+    # Отсчёт от запуска процесса: интерпретатор и импорты входят в отчёт
+    timer = StartupTimer(process_start_ns())
+    timer.mark("imports")
+    parser = argparse.ArgumentParser(description="Демон робота")
+    parser.add_argument("--config", metavar="FILE",
+                        help="JSON конфиг; изменения по команде config сохраняются в него")
+    # Аргументы ниже переопределяют значения из конфига
+    parser.add_argument("--video-port", type=int)
+    parser.add_argument("--command-port", type=int)
+    parser.add_argument("--telemetry-port", type=int)
+    parser.add_argument("--video-control-port", type=int)
+    parser.add_argument("--camera", type=int, help="индекс камеры")
+    parser.add_argument("--record", metavar="DIR", help="включить самописец")
+    parser.add_argument("--safety", action="store_true",
+                        help="бортовая остановка по препятствию / смене сцены")
+    parser.add_argument("--backend", choices=("auto",) + BACKENDS + (MOCK_BACKEND,),
+                        help="auto: бэкенд из кэша, иначе первый рабочий")
+    args = parser.parse_args()
+
+    overrides = {"ports": {}, "camera": {}, "motors": {}}
+    for name, value in (("video", args.video_port), ("commands", args.command_port),
+                        ("telemetry", args.telemetry_port),
+                        ("video_control", args.video_control_port)):
+        if value is not None:
+            overrides["ports"][name] = value
+    if args.camera is not None:
+        overrides["camera"]["index"] = args.camera
+    if args.backend is not None:
+        overrides["motors"]["backend"] = args.backend
+    try:
+        config = updated(load_config(args.config), overrides)
+    except (OSError, ValueError) as e:
+        print(f"❌ Ошибка конфига: {e}")
+        return
+
+    daemon = RobotDaemon(
+        config=config,
+        config_path=args.config,
+        timer=timer,
+        record_dir=args.record,
+        safety=args.safety
+    )
+    daemon.run_forever()
+
+
+if __name__ == "__main__":
+    main()
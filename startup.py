@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Быстрый старт робота: отчёт о времени запуска, кэш состояния
+(последняя рабочая камера, её формат, выбранный GPIO бэкенд)
+и параллельный поиск камеры с короткими таймаутами
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".robot_state.json")
+
+
+def process_start_ns():
+    """
+    Момент запуска процесса по шкале time.monotonic_ns (Linux, точность 10 мс):
+    так в отчёт попадают старт интерпретатора и импорты. None, если неизвестно
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Имя процесса в скобках может содержать пробелы, поля считаем после него
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        age_ns = time.clock_gettime_ns(time.CLOCK_BOOTTIME) - start_ticks * 10**9 // os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+    return time.monotonic_ns() - age_ns
+
+
+class StartupTimer:
+    """Отметки времени запуска относительно t0_ns (по умолчанию - создания таймера)"""
+
+    def __init__(self, t0_ns=None):
+        self.t0_ns = t0_ns if t0_ns is not None else time.monotonic_ns()
+        self.marks = []
+        self._lock = threading.Lock()
+        self._done = set()
+
+    def mark(self, name):
+        with self._lock:
+            self.marks.append((name, time.monotonic_ns() - self.t0_ns))
+
+    def mark_once(self, name):
+        """Отметка, которая ставится только при первом вызове"""
+        with self._lock:
+            if name in self._done:
+                return False
+            self._done.add(name)
+            self.marks.append((name, time.monotonic_ns() - self.t0_ns))
+            return True
+
+    def report(self):
+        with self._lock:
+            marks = sorted(self.marks, key=lambda m: m[1])
+        lines = ["⏱️  Время запуска:"]
+        prev_ns = 0
+        for name, t_ns in marks:
+            lines.append(f"   {name:<20} {t_ns / 1e6:8.1f} мс  (+{(t_ns - prev_ns) / 1e6:.1f} мс)")
+            prev_ns = t_ns
+        return "\n".join(lines)
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(updates, path=STATE_FILE):
+    """Дописывает ключи в файл состояния (атомарно через rename)"""
+    state = load_state(path)
+    state.update(updates)
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️  Не удалось сохранить состояние: {e}")
+
+
+def _fourcc_to_str(value):
+    value = int(value)
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4))
+
+
+def apply_camera_format(cap, fmt):
+    """Применяет формат камеры: {"fourcc", "width", "height", "fps"}"""
+    import cv2
+
+    # FOURCC ставим первым: некоторые камеры дают высокое разрешение только в MJPG
+    if fmt.get("fourcc"):
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fmt["fourcc"]))
+    if fmt.get("width"):
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, fmt["width"])
+    if fmt.get("height"):
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, fmt["height"])
+    if fmt.get("fps"):
+        cap.set(cv2.CAP_PROP_FPS, fmt["fps"])
+
+
+def read_camera_format(cap):
+    import cv2
+
+    return {
+        "fourcc": _fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)).strip("\x00") or None,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS)
+    }
+
+
+class _CameraProbe:
+    """Пробует несколько индексов параллельно, побеждает первый давший кадр"""
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.results = queue.Queue()
+        self._lock = threading.Lock()
+        self._claimed = False
+        self.pending = 0  # Запущенные попытки, чей результат ещё не забран
+
+    def _open(self, index):
+        import cv2
+
+        if sys.platform.startswith("linux"):
+            # Сразу V4L2, без перебора бэкендов (GStreamer и т.п.)
+            cap = cv2.VideoCapture(index, cv2.CAP_V4L2)
+        else:
+            cap = cv2.VideoCapture(index)
+
+        ok = False
+        if cap.isOpened():
+            apply_camera_format(cap, self.fmt)
+            ok, _ = cap.read()
+
+        with self._lock:
+            if ok and not self._claimed:
+                self._claimed = True
+                self.results.put((index, cap))
+                return
+        # Неудача или опоздали: камера уже найдена другим потоком
+        cap.release()
+        self.results.put((index, None))
+
+    def start(self, indices):
+        for index in indices:
+            threading.Thread(target=self._open, args=(index,), daemon=True).start()
+        self.pending += len(indices)
+
+    def wait(self, timeout=None):
+        """
+        Первая камера, давшая кадр, или (None, None). timeout=None - ждать,
+        пока не закончатся все запущенные попытки
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                index, cap = self.results.get(timeout=remaining)
+            except queue.Empty:
+                break
+            self.pending -= 1
+            if cap is not None:
+                return index, cap
+        return None, None
+
+    def abandon(self):
+        """Поздний успех не должен держать камеру открытой"""
+        with self._lock:
+            self._claimed = True
+        while True:
+            try:
+                _, cap = self.results.get_nowait()
+            except queue.Empty:
+                return
+            if cap is not None:
+                cap.release()
+
+
+def probe_camera(preferred=0, indices=range(4), fmt=None, timeout=1.0, use_cache=True,
+                 prefer_cached=True):
+    """
+    Открывает камеру: сначала последнюю рабочую из кэша, затем остальные
+    индексы параллельно. prefer_cached=False - первым пробуется preferred
+    (камеру явно сменили). Возвращает (index, cap) или (None, None)
+    """
+    state = load_state() if use_cache else {}
+    fmt = dict(fmt or {})
+    cached_index = state.get("camera_index")
+    if cached_index is not None and (prefer_cached or cached_index == preferred):
+        # Формат из кэша (например FOURCC) дополняет запрошенный
+        fmt = {**state.get("camera_format", {}), **fmt}
+        first = cached_index
+    else:
+        first = preferred
+
+    probes = [_CameraProbe(fmt)]
+    probes[0].start([first])
+    index, cap = probes[0].wait(timeout)
+    if cap is None:
+        others = [i for i in indices if i != first]
+        if preferred not in others and preferred != first:
+            others.insert(0, preferred)
+        probes.append(_CameraProbe(fmt))
+        probes[1].start(others)
+        index, cap = probes[1].wait(timeout)
+    if cap is None and any(probe.pending for probe in probes):
+        # Камера может открываться дольше таймаута (USB хаб, холодный старт).
+        # Ждём уже идущие попытки: второй дескриптор того же V4L2 устройства
+        # получил бы EBUSY, а демон перезапускал бы подсистему бесконечно
+        print("⏳ Быстрый поиск камеры не удался, ждём медленные камеры...")
+        for probe in probes:
+            index, cap = probe.wait()
+            if cap is not None:
+                break
+    for probe in probes:
+        probe.abandon()
+
+    if cap is not None and use_cache:
+        save_state({"camera_index": index, "camera_format": read_camera_format(cap)})
+    return index, cap
@@ -10,11 +10,11 @@ import time
 import os
 
 class SysfsRobotController:
-    def __init__(self):
+    def __init__(self, pins=None):
         print("🤖 Инициализация робота через sysfs...")
         
         # GPIO пины (номера BCM)
-        self.pins = {
+        self.pins = dict(pins) if pins else {
             'left_forward': 12,
             'left_backward': 13,
             'right_forward': 19,
@@ -22,17 +22,20 @@ class SysfsRobotController:
         }
         
         # Экспортируем пины
+        self.configured_pins = set()
         for name, pin in self.pins.items():
             try:
-                # Экспортируем пин
-                with open('/sys/class/gpio/export', 'w') as f:
-                    f.write(str(pin))
+                direction_path = f'/sys/class/gpio/gpio{pin}/direction'
+                
+                # Экспортируем пин, если он ещё не экспортирован
+                if not os.path.exists(direction_path):
+                    with open('/sys/class/gpio/export', 'w') as f:
+                        f.write(str(pin))
                 
-                # Ждем создания директории
-                time.sleep(0.1)
+                # Ждем, пока udev создаст файлы и выдаст права (обычно единицы мс)
+                self._wait_writable(direction_path)
                 
                 # Настраиваем направление (выход)
-                direction_path = f'/sys/class/gpio/gpio{pin}/direction'
                 with open(direction_path, 'w') as f:
                     f.write('out')
                 
@@ -41,14 +44,27 @@ class SysfsRobotController:
                 with open(value_path, 'w') as f:
                     f.write('0')
                     
+                self.configured_pins.add(name)
                 print(f"✅ Пин GPIO{pin} настроен")
                 
             except Exception as e:
                 print(f"⚠️  Ошибка настройки пина {pin}: {e}")
                 # Если пин уже экспортирован, продолжаем
         
+        if not self.configured_pins:
+            # Иначе команды «выполнялись» бы без единого рабочего пина
+            raise RuntimeError("sysfs GPIO недоступен: не настроен ни один пин")
         self.current_speed = 0.7
     
+    @staticmethod
+    def _wait_writable(path, timeout=0.5, interval=0.002):
+        """Короткий опрос вместо фиксированного sleep после экспорта"""
+        deadline = time.monotonic() + timeout
+        while not os.access(path, os.W_OK):
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(interval)
+    
     def _set_pin(self, pin_number, value):
         """Установка значения пина (0 или 1)"""
         try:
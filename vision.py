@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Бортовая проверка безопасности по кадрам камеры.
+
+На уменьшенном сером кадре (80x60) считаются дешёвые признаки:
+  * scene_change - средняя разница с предыдущим кадром (резкая смена сцены)
+  * edge_density - доля резких перепадов яркости в нижней полосе кадра
+    (близкое препятствие перед колёсами)
+  * dark_ratio   - яркость нижней полосы относительно скользящего среднего
+    (камера упёрлась в препятствие)
+Срабатывание подтверждается несколькими кадрами подряд и сразу вызывает
+on_trigger, без сетевого перехода. Если обработка не укладывается в бюджет,
+кадры начинают прореживаться.
+
+Бенчмарк на записи самописца:
+    python vision.py DIR
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+DEFAULT_THRESHOLDS = {
+    "scene_change": 0.25,   # средняя |разница| кадров, доля от 255
+    "edge_density": 0.35,   # доля пикселей нижней полосы с резким перепадом
+    "dark_ratio": 0.4,      # яркость полосы ниже 40% от обычной
+}
+
+
+class SafetyVision:
+    def __init__(self, on_trigger=None, size=(80, 60), band=0.33, thresholds=None,
+                 confirm_frames=2, budget_ms=5.0, adaptive=True):
+        # Вызывается как on_trigger(reason, features, t_ns)
+        self.on_trigger = on_trigger
+        self.size = size
+        self.band = band
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.confirm_frames = confirm_frames
+        self.budget_ns = int(budget_ms * 1e6)
+        self.adaptive = adaptive
+
+        self._prev = None
+        self._baseline = None
+        self._streak = 0
+        self._skip = 0
+        self.stride = 1  # Обрабатывается каждый stride-й кадр
+
+        self.frames = 0
+        self.processed = 0
+        self.overruns = 0
+        self.triggers = 0
+        self.durations_ns = []
+
+    def features(self, cv2, frame):
+        """Признаки кадра; frame - BGR кадр камеры любого размера"""
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        if self._prev is None:
+            change = 0.0
+        else:
+            change = float(cv2.absdiff(gray, self._prev).mean()) / 255.0
+        self._prev = gray
+
+        band = gray[int(gray.shape[0] * (1.0 - self.band)):].astype(np.int16)
+        gx = np.abs(np.diff(band, axis=1))
+        gy = np.abs(np.diff(band, axis=0))
+        edges = (gx[1:, :] + gy[:, 1:]) > 40
+        brightness = float(band.mean())
+
+        if self._baseline is None:
+            self._baseline = brightness
+        dark_ratio = brightness / max(self._baseline, 1.0)
+        # Медленное скользящее среднее, чтобы препятствие его не «съело»
+        self._baseline += 0.02 * (brightness - self._baseline)
+
+        return {
+            "scene_change": change,
+            "edge_density": float(edges.mean()),
+            "dark_ratio": dark_ratio
+        }
+
+    def _reason(self, features):
+        t = self.thresholds
+        if features["edge_density"] > t["edge_density"]:
+            return "obstacle"
+        if features["dark_ratio"] < t["dark_ratio"]:
+            return "obstacle"
+        if features["scene_change"] > t["scene_change"]:
+            return "scene_change"
+        return None
+
+    def process(self, cv2, frame, t_ns=None):
+        """Обрабатывает кадр; возвращает причину срабатывания или None"""
+        self.frames += 1
+        if self._skip > 0:
+            self._skip -= 1
+            return None
+        self._skip = self.stride - 1
+
+        start_ns = time.monotonic_ns()
+        features = self.features(cv2, frame)
+        reason = self._reason(features)
+        elapsed_ns = time.monotonic_ns() - start_ns
+
+        self.processed += 1
+        self.durations_ns.append(elapsed_ns)
+        if len(self.durations_ns) > 1000:
+            del self.durations_ns[:500]
+
+        # Бюджет: при перерасходе прореживаем, при большом запасе возвращаемся
+        if elapsed_ns > self.budget_ns:
+            self.overruns += 1
+            if self.adaptive:
+                self.stride = min(self.stride + 1, 4)
+        elif elapsed_ns < self.budget_ns // 2 and self.stride > 1:
+            self.stride -= 1
+
+        self._streak = self._streak + 1 if reason else 0
+        if self._streak >= self.confirm_frames:
+            # Срабатываем на каждом кадре, пока опасность видна: оператор мог
+            # снова скомандовать движение; triggers считает только начала
+            if self._streak == self.confirm_frames:
+                self.triggers += 1
+            if self.on_trigger:
+                self.on_trigger(reason, features, t_ns if t_ns is not None else start_ns)
+            return reason
+        return None
+
+    def stats(self):
+        durations = np.array(self.durations_ns or [0]) / 1e6
+        return {
+            "frames": self.frames,
+            "processed": self.processed,
+            "stride": self.stride,
+            "overruns": self.overruns,
+            "triggers": self.triggers,
+            "p50_ms": round(float(np.percentile(durations, 50)), 3),
+            "p99_ms": round(float(np.percentile(durations, 99)), 3),
+            "max_ms": round(float(durations.max()), 3),
+            "budget_ms": self.budget_ns / 1e6
+        }
+
+
+def benchmark(path, budget_ms=5.0):
+    """Прогоняет запись самописца через SafetyVision и печатает статистику"""
+    import cv2
+    from recorder import RecordingReader, RECORD_FRAME
+
+    triggers = []
+    reader = RecordingReader(path)
+    vision = SafetyVision(
+        on_trigger=lambda reason, f, t_ns: triggers.append(
+            {"t_s": round((t_ns - reader.start_ns) / 1e9, 3), "reason": reason}
+        ),
+        budget_ms=budget_ms,
+        # В бенчмарке обрабатываем все кадры: прореживание скрыло бы стоимость
+        adaptive=False
+    )
+
+    records = reader.records()
+    for kind, t_ns, payload in records:
+        if kind != RECORD_FRAME:
+            continue
+        frame = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is not None:
+            vision.process(cv2, frame, t_ns)
+    records.close()
+    reader.close()
+
+    result = vision.stats()
+    result["trigger_log"] = triggers
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк проверки безопасности на записи")
+    parser.add_argument("path", help="каталог записи самописца")
+    parser.add_argument("--budget-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    benchmark(args.path, args.budget_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,14 @@
+import argparse
 import zmq
 import json
 import time
 import curses
 
 class RobotClientCurses:
-    def __init__(self, robot_ip):
+    def __init__(self, robot_ip, port=5555):  # robot_daemon.py слушает команды на 5556
         context = zmq.Context()
         self.socket = context.socket(zmq.REQ)
-        self.socket.connect(f"tcp://{robot_ip}:5555")
+        self.socket.connect(f"tcp://{robot_ip}:{port}")
         self.socket.setsockopt(zmq.RCVTIMEO, 5000)
         self.current_speed = 0.7
         self.is_connected = False
@@ -91,7 +92,12 @@ def main_curses(stdscr, client):
 
 if __name__ == "__main__":
     #robot_ip = input("Введите IP адрес Raspberry Pi: ").strip()
-    client = RobotClientCurses("192.168.1.139")
+    parser = argparse.ArgumentParser(description="Управление роботом с клавиатуры")
+    parser.add_argument("robot_ip", nargs="?", default="192.168.1.139")
+    parser.add_argument("--port", type=int, default=5555,
+                        help="порт команд: 5555 - отдельные скрипты, 5556 - robot_daemon.py")
+    args = parser.parse_args()
+    client = RobotClientCurses(args.robot_ip, args.port)
     
     if client.connect():
         curses.wrapper(main_curses, client)